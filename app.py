@@ -5,17 +5,40 @@ Flask App for Chord Generation
 Takes user input for chords and generates audio using FluidSynth
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
+import click
+import asyncio
 import platform
 import os
+import io
 import time
 import tempfile
 import json
+import re
+import functools
+import wave
+import struct
+import hashlib
+import base64
+import uuid
+import queue
+import threading
+import zipfile
+import sqlite3
+import unicodedata
+from collections import OrderedDict, deque
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from urllib.parse import urlencode
+import numpy as np
 from dotenv import load_dotenv
 import openai
+import httpx
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Tuple
 
 # Load environment variables
 load_dotenv()
@@ -24,7 +47,7 @@ load_dotenv()
 class ChordSheet(BaseModel):
     meta: Dict[str, str]  # e.g., {"title": "All of Me", "key": "C major", ...}
     chords: Dict[str, List[str]]  # section -> list of bar strings
-    transposition: Dict[str, Dict[str, List[str]]]  # instrument -> bars
+    transposition: Dict[str, Dict[str, List[str]]] = {}  # instrument -> {"bars": [...]}, computed locally
     notes: List[str]  # freeform performance notes
 
 def _normalize_for_validation(candidate_json_str: str) -> str:
@@ -81,6 +104,75 @@ app = Flask(__name__)
 # Configure OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# Audio configuration
+SOUNDFONT_PATH = os.getenv('CHORDS_SOUNDFONT', './piano.sf2')
+SYNTH_POOL_SIZE = int(os.getenv('CHORDS_SYNTH_POOL_SIZE', '2'))
+SYNTH_CHANNELS = int(os.getenv('CHORDS_SYNTH_CHANNELS', '16'))  # concurrent requests sharing one device synth
+SYNTH_CHECKOUT_TIMEOUT = float(os.getenv('CHORDS_SYNTH_CHECKOUT_TIMEOUT', '30'))
+AUDIO_MODE = os.getenv('CHORDS_AUDIO_MODE', 'device')  # "device" plays on the server, "offline" returns audio
+AUDIO_FORMAT = os.getenv('CHORDS_AUDIO_FORMAT', 'wav')  # "wav" or "flac" (needs soundfile)
+SAMPLE_RATE = int(os.getenv('CHORDS_SAMPLE_RATE', '44100'))
+RELEASE_TAIL = float(os.getenv('CHORDS_RELEASE_TAIL', '1.0'))  # seconds rendered after the last note off
+TICKS_PER_BEAT = 480
+# A MIDI tempo is microseconds per beat in three bytes, so slower tempos can't be written
+MIDI_MAX_TEMPO = 0xFFFFFF
+MIDI_MIN_BPM = 60000000 / MIDI_MAX_TEMPO
+# Render farm processes per server process; kept small because every web worker gets its own farm
+RENDER_PROCESSES = int(os.getenv('CHORDS_RENDER_PROCESSES', str(min(2, os.cpu_count() or 1))))
+RENDER_SEGMENT_STEPS = int(os.getenv('CHORDS_RENDER_SEGMENT_STEPS', '8'))  # progression steps per parallel render segment
+RENDER_PARALLEL_MIN_STEPS = int(os.getenv('CHORDS_RENDER_PARALLEL_MIN_STEPS', '48'))  # shorter progressions render in-process
+STREAM_BUFFER_CHUNKS = int(os.getenv('CHORDS_STREAM_BUFFER_CHUNKS', '4'))  # rendered chunks queued ahead of the client
+STREAM_CHUNK_SECONDS = float(os.getenv('CHORDS_STREAM_CHUNK_SECONDS', '2.0'))  # longest streamed chunk
+STREAM_POOL_SIZE = int(os.getenv('CHORDS_STREAM_POOL_SIZE', '2'))  # concurrent streams, each with its own synth
+JOB_WORKERS = int(os.getenv('CHORDS_JOB_WORKERS', '4'))
+JOB_TTL = float(os.getenv('CHORDS_JOB_TTL', '600'))  # seconds a finished job stays queryable
+AUDIO_MIME_TYPES = {"wav": "audio/wav", "flac": "audio/flac"}
+RENDER_BACKEND = os.getenv('CHORDS_RENDER_BACKEND', 'synth')  # "synth" renders with FluidSynth, "bank" mixes pre-rendered notes
+NOTE_BANK_VELOCITIES = tuple(int(v) for v in os.getenv('CHORDS_NOTE_BANK_VELOCITIES', '48,80,112').split(','))
+NOTE_BANK_SECONDS = float(os.getenv('CHORDS_NOTE_BANK_SECONDS', '4.0'))  # longest note the bank can voice
+NOTE_BANK_PATH = os.getenv('CHORDS_NOTE_BANK', './piano_bank.npy')  # built with `flask --app app build-note-bank`
+NOTE_BANK_RELEASE = float(os.getenv('CHORDS_NOTE_BANK_RELEASE', '0.3'))  # fade applied after a banked note is released
+ARTIFACT_DIR = os.getenv('CHORDS_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), 'chords_artifacts'))
+ARTIFACT_TTL = float(os.getenv('CHORDS_ARTIFACT_TTL', str(24 * 3600)))  # seconds since an artifact was last produced
+ARTIFACT_MAX_BYTES = int(float(os.getenv('CHORDS_ARTIFACT_MAX_MB', '256')) * 1024 * 1024)
+AUDIO_CACHE_MEMORY_BYTES = int(float(os.getenv('CHORDS_AUDIO_CACHE_MEMORY_MB', '64')) * 1024 * 1024)
+AUDIO_CACHE_DISK_BYTES = int(float(os.getenv('CHORDS_AUDIO_CACHE_DISK_MB', '512')) * 1024 * 1024)
+AUDIO_CACHE_DIR = os.getenv('CHORDS_AUDIO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'chords_audio_cache'))
+EXPORT_WORKERS = int(os.getenv('CHORDS_EXPORT_WORKERS', '4'))
+EXPORT_LOOKAHEAD = int(os.getenv('CHORDS_EXPORT_LOOKAHEAD', '4'))  # finished export entries held ahead of the client
+EXPORT_MAX_ENTRIES = int(os.getenv('CHORDS_EXPORT_MAX_ENTRIES', '600'))
+CHORD_PARSE_CACHE_SIZE = int(os.getenv('CHORDS_PARSE_CACHE_SIZE', '4096'))  # distinct chord symbols kept parsed
+SCALE_SOURCE = os.getenv('CHORDS_SCALE_SOURCE', 'local')  # "local" ranks the built-in catalog, "openai" asks the model
+SCALE_SUGGESTIONS = int(os.getenv('CHORDS_SCALE_SUGGESTIONS', '5'))  # scales returned per chord
+VOICE_LEADING = os.getenv('CHORDS_VOICE_LEADING', 'on') == 'on'  # revoice progressions for smooth voice leading
+VOICING_LOW = int(os.getenv('CHORDS_VOICING_LOW', '48'))  # lowest MIDI note a voiced chord may start on
+VOICING_CENTER = float(os.getenv('CHORDS_VOICING_CENTER', '62'))  # register voiced progressions stay around
+SHEET_TRANSPOSITIONS = os.getenv('CHORDS_SHEET_TRANSPOSITIONS', 'Concert,Bb,Eb').split(',')  # parts added to chord sheets
+CHORD_BATCH_MAX = int(os.getenv('CHORDS_CHORD_BATCH_MAX', '20000'))  # chord symbols accepted per /api/chords/batch call
+CHORD_SYMBOL_MAX_LENGTH = int(os.getenv('CHORDS_CHORD_SYMBOL_MAX_LENGTH', '32'))  # longest symbol /api/chords/batch parses
+LLM_CACHE_PATH = os.getenv('CHORDS_LLM_CACHE', os.path.join(tempfile.gettempdir(), 'chords_llm_cache.sqlite3'))
+LLM_REFRESH_WORKERS = int(os.getenv('CHORDS_LLM_REFRESH_WORKERS', '2'))  # threads refreshing stale model answers
+SCALE_MODEL = os.getenv('CHORDS_SCALE_MODEL', 'gpt-4o-mini')
+SCALE_CACHE_TTL = float(os.getenv('CHORDS_SCALE_CACHE_TTL', str(30 * 24 * 3600)))  # seconds before a cached answer is refreshed
+SCALE_PROMPT_VERSION = 1  # bump when the scale prompt changes so cached answers are asked again
+SONG_MODEL = os.getenv('CHORDS_SONG_MODEL', 'gpt-4o-mini')
+SHEET_MODEL = os.getenv('CHORDS_SHEET_MODEL', 'gpt-5-mini')
+SONG_CACHE_TTL = float(os.getenv('CHORDS_SONG_CACHE_TTL', str(7 * 24 * 3600)))  # seconds before a cached song answer is refreshed
+SONG_FUZZY_MATCH = float(os.getenv('CHORDS_SONG_FUZZY_MATCH', '0.6'))  # trigram similarity of fuzzy title candidates
+SONG_PROMPT_VERSION = 1  # bump when the song analysis prompt changes
+SHEET_PROMPT_VERSION = 1  # bump when the chord sheet prompt changes
+SCALE_WORKERS = int(os.getenv('CHORDS_SCALE_WORKERS', '8'))  # threads looking up scales alongside chord audio
+SCALE_BUDGET_MS = float(os.getenv('CHORDS_SCALE_BUDGET_MS', '250'))  # how long /generate_chord waits for scales
+SCALE_FOLLOWUP_TIMEOUT = float(os.getenv('CHORDS_SCALE_FOLLOWUP_TIMEOUT', '30'))  # longest /scales waits for a lookup
+LLM_MAX_CONNECTIONS = int(os.getenv('CHORDS_LLM_MAX_CONNECTIONS', '64'))  # model calls in flight per worker
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv('CHORDS_LLM_KEEPALIVE_CONNECTIONS', '16'))  # idle connections kept open
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('CHORDS_LLM_KEEPALIVE_EXPIRY', '60'))  # seconds an idle connection is kept
+LLM_CONNECT_TIMEOUT = float(os.getenv('CHORDS_LLM_CONNECT_TIMEOUT', '5'))
+LLM_MAX_RETRIES = int(os.getenv('CHORDS_LLM_MAX_RETRIES', '2'))
+SCALE_TIMEOUT = float(os.getenv('CHORDS_SCALE_TIMEOUT', '15'))  # seconds per scale suggestion call
+SONG_TIMEOUT = float(os.getenv('CHORDS_SONG_TIMEOUT', '30'))  # seconds per song analysis call
+SHEET_TIMEOUT = float(os.getenv('CHORDS_SHEET_TIMEOUT', '60'))  # seconds per chord sheet call
+
 # MIDI note to note name mapping
 NOTE_NAMES = {
     0: "C", 1: "C#", 2: "D", 3: "D#", 4: "E", 5: "F", 
@@ -93,6 +185,133 @@ def get_note_name(midi_note):
     octave = (midi_note // 12) - 1
     return f"{note_name}{octave}"
 
+# Pitch class of every note name we accept, sharps and flats alike
+NOTE_INDEX = {name: pitch_class for pitch_class, name in NOTE_NAMES.items()}
+NOTE_INDEX.update({"Db": 1, "Eb": 3, "Gb": 6, "Ab": 8, "Bb": 10, "Cb": 11, "Fb": 4, "E#": 5, "B#": 0})
+
+# Popcount and ascending bit positions of every 12-bit mask
+_MASK_POPCOUNT = [bin(mask).count("1") for mask in range(4096)]
+_MASK_PITCH_CLASSES = [tuple(pc for pc in range(12) if mask >> pc & 1) for mask in range(4096)]
+
+def _rotate_mask(mask, semitones):
+    semitones %= 12
+    return ((mask << semitones) | (mask >> (12 - semitones))) & 0xFFF
+
+class PitchClassSet:
+    """A chord or scale as a 12-bit pitch-class mask (bit n is pitch class n) plus its root
+
+    Transposition is a bit rotation; containment, intersection and distance
+    are single bit operations, so theory helpers never search note lists.
+    """
+
+    __slots__ = ("mask", "root")
+
+    def __init__(self, mask, root=0):
+        self.mask = mask & 0xFFF
+        self.root = root % 12
+
+    @classmethod
+    def from_intervals(cls, root, intervals):
+        mask = 0
+        for interval in intervals:
+            mask |= 1 << ((root + interval) % 12)
+        return cls(mask, root)
+
+    @classmethod
+    def from_midi(cls, midi_notes, root=None):
+        """Set of MIDI notes; the root defaults to the lowest note"""
+        mask = 0
+        for note in midi_notes:
+            mask |= 1 << (note % 12)
+        if root is None:
+            root = min(midi_notes) % 12 if midi_notes else 0
+        return cls(mask, root)
+
+    def transpose(self, semitones):
+        return PitchClassSet(_rotate_mask(self.mask, semitones), self.root + semitones)
+
+    def intervals(self):
+        """Semitones above the root, ascending"""
+        return _MASK_PITCH_CLASSES[_rotate_mask(self.mask, -self.root)]
+
+    def pitch_classes(self):
+        """Pitch classes ascending from the root"""
+        return tuple((self.root + interval) % 12 for interval in self.intervals())
+
+    def note_names(self):
+        return [NOTE_NAMES[pc] for pc in self.pitch_classes()]
+
+    def issubset(self, other):
+        return not self.mask & ~other.mask
+
+    def intersection(self, other):
+        return PitchClassSet(self.mask & other.mask, self.root)
+
+    def union(self, other):
+        return PitchClassSet(self.mask | other.mask, self.root)
+
+    def distance(self, other):
+        """Number of pitch classes in one set but not the other"""
+        return _MASK_POPCOUNT[self.mask ^ other.mask]
+
+    def __contains__(self, pitch_class):
+        return bool(self.mask >> (pitch_class % 12) & 1)
+
+    def __len__(self):
+        return _MASK_POPCOUNT[self.mask]
+
+    def __eq__(self, other):
+        return isinstance(other, PitchClassSet) and (self.mask, self.root) == (other.mask, other.root)
+
+    def __hash__(self):
+        return hash((self.mask, self.root))
+
+    def __repr__(self):
+        return f"PitchClassSet({'-'.join(self.note_names())}, root={NOTE_NAMES[self.root]})"
+
+def _modes(intervals, names):
+    """Interval tuples of every mode of a scale, keyed by mode name"""
+    return {name: tuple(sorted((interval - intervals[degree]) % 12 for interval in intervals))
+            for degree, name in enumerate(names)}
+
+CHORD_PATTERNS = {
+    "major": (0, 4, 7),           # Root, Major 3rd, Perfect 5th
+    "minor": (0, 3, 7),           # Root, Minor 3rd, Perfect 5th
+    "diminished": (0, 3, 6),      # Root, Minor 3rd, Diminished 5th
+    "augmented": (0, 4, 8),       # Root, Major 3rd, Augmented 5th
+    "major7": (0, 4, 7, 11),      # Major 7th chord
+    "minor7": (0, 3, 7, 10),      # Minor 7th chord
+    "dominant7": (0, 4, 7, 10),   # Dominant 7th chord
+    "diminished7": (0, 3, 6, 9),  # Diminished 7th chord
+    "power": (0, 7),              # Power chord (root + 5th)
+}
+SCALE_PATTERNS = {
+    **_modes((0, 2, 4, 5, 7, 9, 11), ["Major (Ionian)", "Dorian", "Phrygian", "Lydian", "Mixolydian",
+                                      "Natural Minor (Aeolian)", "Locrian"]),
+    **_modes((0, 2, 3, 5, 7, 9, 11), ["Melodic Minor", "Dorian b2", "Lydian Augmented", "Lydian Dominant",
+                                      "Mixolydian b6", "Locrian #2", "Altered"]),
+    **_modes((0, 2, 3, 5, 7, 8, 11), ["Harmonic Minor", "Locrian #6", "Ionian #5", "Dorian #4",
+                                      "Phrygian Dominant", "Lydian #2", "Altered Diminished"]),
+    "Major Pentatonic": (0, 2, 4, 7, 9),
+    "Minor Pentatonic": (0, 3, 5, 7, 10),
+    "Blues": (0, 3, 5, 6, 7, 10),
+    "Major Blues": (0, 2, 3, 4, 7, 9),
+    "Dominant Bebop": (0, 2, 4, 5, 7, 9, 10, 11),
+    "Major Bebop": (0, 2, 4, 5, 7, 8, 9, 11),
+    "Dorian Bebop": (0, 2, 3, 4, 5, 7, 9, 10),
+    "Half-Whole Diminished": (0, 1, 3, 4, 6, 7, 9, 10),
+    "Whole-Half Diminished": (0, 2, 3, 5, 6, 8, 9, 11),
+    "Whole Tone": (0, 2, 4, 6, 8, 10),
+}
+# Every chord quality and scale at root C; transpose() moves them to any key
+CHORD_MASKS = {chord_type: PitchClassSet.from_intervals(0, pattern) for chord_type, pattern in CHORD_PATTERNS.items()}
+SCALE_MASKS = {name: PitchClassSet.from_intervals(0, pattern) for name, pattern in SCALE_PATTERNS.items()}
+# Row n holds the 0/1 membership of every pitch class in mask n, so histograms of masks are one fancy index
+MASK_MEMBERSHIP = np.array([[mask >> pc & 1 for pc in range(12)] for mask in range(4096)], dtype=float)
+
+# Name of every MIDI note, so arrays of notes can be named with one fancy index
+NOTE_NAME_TABLE = np.array([get_note_name(note) for note in range(128)], dtype=object)
+
 def get_driver():
     """Smart driver selection for cross-platform compatibility"""
     system = platform.system().lower()
@@ -105,101 +324,1273 @@ def get_driver():
     else: 
         return "pulseaudio"
 
+class PooledSynth:
+    """A started synth in a SynthPool and the MIDI channels it has free"""
+
+    def __init__(self, fs, sfid, channels):
+        self.fs = fs
+        self.sfid = sfid
+        self.free = list(reversed(range(channels)))  # pop() hands out channel 0 first
+        self.leased = 0
+        self.broken = False
+
+class SynthPool:
+    """Process-wide pool of started FluidSynth instances with the SoundFont loaded
+
+    Each synth serves up to `channels` requests at once, one MIDI channel per
+    request. Leases fill the first synth's channels before spilling over onto
+    another synth, and wait for a channel to be released once all `size`
+    synths are full.
+
+    A pool without a driver holds offline synths whose samples are pulled with
+    get_samples() instead of being played on the server's audio device. Those
+    mix every channel into one buffer, so offline pools use a single channel.
+    """
+
+    def __init__(self, size, soundfont, driver, sample_rate=SAMPLE_RATE, channels=1):
+        self.size = max(1, size)
+        self.soundfont = soundfont
+        self.driver = driver
+        self.sample_rate = sample_rate
+        self.channels = max(1, min(16, channels))
+        self._synths = []
+        self._starting = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _create(self):
+        """Start a synth on the pool's driver and load the SoundFont on every channel"""
+        import fluidsynth
+
+        fs = fluidsynth.Synth(samplerate=float(self.sample_rate))
+        if self.driver:
+            fs.start(driver=self.driver)
+        sfid = fs.sfload(self.soundfont)
+        for channel in range(self.channels):
+            fs.program_select(channel, sfid, 0, 0)
+        print(f"🎹 Started pooled synth ({self.driver or 'offline'})")
+        return PooledSynth(fs, sfid, self.channels)
+
+    def _start_synth(self):
+        """Start a synth for a slot already reserved in self._starting"""
+        try:
+            entry = self._create()
+        except Exception:
+            with self._cond:
+                self._starting -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._starting -= 1
+            self._synths.append(entry)
+            self._cond.notify_all()
+        return entry
+
+    def _acquire(self, timeout):
+        """Lease a free channel, starting a synth while the pool is below its size"""
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            with self._cond:
+                while True:
+                    for entry in self._synths:
+                        if entry.free:
+                            entry.leased += 1
+                            if waited:
+                                self.waited += 1
+                            return entry, entry.free.pop()
+                    if len(self._synths) + self._starting < self.size:
+                        self._starting += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No synth channel available after {timeout:.1f}s")
+                    waited = True
+                    self._cond.wait(remaining)
+            # Spill over onto a new synth, started outside the lock
+            self._start_synth()
+
+    def _release(self, entry, channel, healthy):
+        """Silence a leased channel and hand it back, retiring synths that failed"""
+        if healthy and not entry.broken:
+            try:
+                entry.fs.cc(channel, 123, 0)  # All notes off on this channel only
+                if not self.driver:
+                    entry.fs.cc(channel, 120, 0)  # All sound off so release tails don't leak into the next render
+            except Exception:
+                healthy = False
+        delete = False
+        with self._cond:
+            entry.leased -= 1
+            if healthy and not entry.broken:
+                entry.free.append(channel)
+            else:
+                # Stop leasing from a synth that failed mid-playback; delete it once its other users are done
+                entry.broken = True
+                if entry in self._synths:
+                    self._synths.remove(entry)
+                delete = entry.leased == 0
+            self._cond.notify_all()
+        if delete:
+            try:
+                entry.fs.delete()
+            except Exception:
+                pass
+
+    @contextmanager
+    def synth(self, timeout=SYNTH_CHECKOUT_TIMEOUT):
+        """Lease a synth channel for the block, yielding (synth, channel, wait_seconds)"""
+        start = time.perf_counter()
+        entry, channel = self._acquire(timeout)
+        wait = time.perf_counter() - start
+        with self._cond:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        healthy = False
+        try:
+            yield entry.fs, channel, wait
+            healthy = True
+        except GeneratorExit:
+            # A streaming consumer stopped early; the synth itself is fine
+            healthy = True
+            raise
+        finally:
+            self._release(entry, channel, healthy)
+
+    def warm(self):
+        """Start every synth up front so no request pays the startup cost"""
+        while True:
+            with self._cond:
+                if len(self._synths) + self._starting >= self.size:
+                    return len(self._synths)
+                self._starting += 1
+            self._start_synth()
+
+    def stats(self):
+        """Pool size, channel usage and checkout wait statistics"""
+        with self._cond:
+            return {
+                "driver": self.driver or "offline",
+                "size": self.size,
+                "started": len(self._synths),
+                "channels_per_synth": self.channels,
+                "channels_in_use": sum(entry.leased for entry in self._synths),
+                "checkouts": self.checkouts,
+                "queued_checkouts": self.waited,
+                "avg_wait_ms": round(1000 * self.total_wait / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 3),
+            }
+
+_synth_pools = {}
+_synth_pool_lock = threading.Lock()
+
+def get_synth_pool(offline=False, stream=False):
+    """Get the process-wide pool for device playback, offline rendering or streams, creating it on first use
+
+    Streams get a pool of their own because they hold a synth for as long as
+    the client takes to download, which must not starve other offline renders.
+    """
+    key = "stream" if stream else "offline" if offline else "device"
+    with _synth_pool_lock:
+        if key not in _synth_pools:
+            if stream:
+                _synth_pools[key] = SynthPool(STREAM_POOL_SIZE, SOUNDFONT_PATH, None)
+            elif offline:
+                _synth_pools[key] = SynthPool(SYNTH_POOL_SIZE, SOUNDFONT_PATH, None)
+            else:
+                _synth_pools[key] = SynthPool(SYNTH_POOL_SIZE, SOUNDFONT_PATH, get_driver(), channels=SYNTH_CHANNELS)
+        return _synth_pools[key]
+
+_synth_warmup_started = False
+_synth_warmup_lock = threading.Lock()
+
+def warm_synths():
+    """Start every synth of the pool the configured audio mode plays on"""
+    try:
+        print(f"🎹 Warmed {get_synth_pool(offline=AUDIO_MODE == 'offline').warm()} synth(s)")
+    except Exception as e:
+        print(f"⚠️ Synth pool warmup failed: {e}")
+
+@app.before_request
+def start_synth_warmup():
+    """Warm the synth pool in the background once this process serves its first request
+
+    Warming at import would also start synths in CLI commands and in the
+    debug reloader's parent process, which never plays anything.
+    """
+    global _synth_warmup_started
+    with _synth_warmup_lock:
+        if _synth_warmup_started:
+            return
+        _synth_warmup_started = True
+    threading.Thread(target=warm_synths, name="chords-synth-warmup", daemon=True).start()
+
 def generate_chord_audio(chord_notes, duration=2.5, velocity=96):
-    """Generate audio for a chord using FluidSynth"""
+    """Generate audio for a chord using a pooled FluidSynth instance"""
     try:
-        import fluidsynth
-        
-        # Get best driver for platform
-        driver = get_driver()
-        print(f"🎯 Using {driver} driver")
-        
-        # Initialize FluidSynth
-        sf2 = "./piano.sf2"
-        fs = fluidsynth.Synth()
-        fs.start(driver=driver)
-        
-        # Load SoundFont
-        sfid = fs.sfload(sf2)
-        fs.program_select(0, sfid, 0, 0)
-        
-        # Play chord
-        print("🎵 Playing chord...")
-        for note in chord_notes:
-            fs.noteon(0, note, velocity)
-        
-        time.sleep(duration)
-        
-        # Stop notes
-        for note in chord_notes:
-            fs.noteoff(0, note)
+        pool = get_synth_pool()
+        with pool.synth() as (fs, channel, wait):
+            # Play chord
+            print("🎵 Playing chord...")
+            for note in chord_notes:
+                fs.noteon(channel, note, velocity)
+            
+            time.sleep(duration)
+            
+            # Stop notes
+            for note in chord_notes:
+                fs.noteoff(channel, note)
         
-        fs.delete()
-        return {"success": True, "method": "audio", "driver": driver}
+        return {"success": True, "method": "audio", "driver": pool.driver, "pool_wait_ms": round(wait * 1000, 3)}
         
     except Exception as e:
         print(f"⚠️ Audio failed: {e}")
         return {"success": False, "error": str(e), "method": "audio"}
 
-def create_midi_file(chord_notes, duration=2.5, velocity=96):
-    """Create MIDI file as fallback when audio fails"""
+def chord_events(chord_notes, start, length, velocity):
+    """Note on/off events (seconds, note, velocity) for a chord held for `length` seconds"""
+    events = [(start, note, velocity) for note in chord_notes]
+    events += [(start + length, note, 0) for note in chord_notes]
+    return events
+
+def render_events(events, total_seconds):
+    """Render (seconds, note, velocity) events offline; velocity 0 means note off
+
+    Returns float32 PCM with shape (frames, 2), produced by the backend chosen
+    with CHORDS_RENDER_BACKEND.
+    """
+    chunks = list(iter_render_events(events, total_seconds))
+    return np.concatenate(chunks) if chunks else np.zeros((0, 2), dtype=np.float32)
+
+def iter_render_events(events, total_seconds, split_seconds=(), pool=None):
+    """Render events as consecutive PCM chunks that end at each split point and at total_seconds"""
+    if RENDER_BACKEND == "bank":
+        return get_note_bank().iter_render(events, total_seconds, split_seconds)
+    return synth_iter_render(events, total_seconds, split_seconds, pool=pool)
+
+def synth_render_events(events, total_seconds, pool=None):
+    """Render note events with FluidSynth into one PCM buffer"""
+    chunks = list(synth_iter_render(events, total_seconds, pool=pool))
+    return np.concatenate(chunks) if chunks else np.zeros((0, 2), dtype=np.float32)
+
+def synth_iter_render(events, total_seconds, split_seconds=(), pool=None):
+    """Render note events with FluidSynth, yielding a chunk at every split point
+
+    Samples are pulled from a driverless synth as fast as it can compute them,
+    so rendering takes a fraction of the audio's duration. One synth is used
+    for the whole render, so notes ring across chunk boundaries.
+    """
+    pool = pool or get_synth_pool(offline=True)
+    total_frames = int(round(total_seconds * pool.sample_rate))
+    splits = sorted({min(int(round(x * pool.sample_rate)), total_frames) for x in split_seconds} | {total_frames})
+    # Note offs sort before note ons at the same instant
+    ordered = sorted(events, key=lambda e: (e[0], e[2] > 0))
+    index = 0
+    position = 0
+    with pool.synth() as (fs, channel, wait):
+        for split in splits:
+            parts = []
+            while index < len(ordered):
+                seconds, note, velocity = ordered[index]
+                frame = min(int(round(seconds * pool.sample_rate)), total_frames)
+                if frame >= split:
+                    break
+                if frame > position:
+                    parts.append(fs.get_samples(frame - position))
+                    position = frame
+                if velocity:
+                    fs.noteon(channel, note, velocity)
+                else:
+                    fs.noteoff(channel, note)
+                index += 1
+            if split > position:
+                parts.append(fs.get_samples(split - position))
+                position = split
+            if parts:
+                yield np.concatenate(parts).reshape(-1, 2).astype(np.float32) / 32768.0
+
+def soft_limit(pcm, threshold=0.8):
+    """Pass samples below the threshold untouched and bend louder ones smoothly towards ±1"""
+    magnitude = np.abs(pcm)
+    over = magnitude > threshold
+    if over.any():
+        headroom = 1.0 - threshold
+        pcm[over] = np.sign(pcm[over]) * (threshold + headroom * np.tanh((magnitude[over] - threshold) / headroom))
+    return pcm
+
+class NoteBank:
+    """Pre-rendered PCM for all 128 MIDI notes at a few velocity layers
+
+    Chords and scales are built by adding slices of these buffers together
+    instead of running a synth, so the same events always give the same
+    samples. Notes are rendered the first time they are needed unless the bank
+    was loaded from a file built by `build-note-bank`.
+    """
+
+    def __init__(self, velocities=NOTE_BANK_VELOCITIES, seconds=NOTE_BANK_SECONDS,
+                 release=NOTE_BANK_RELEASE, sample_rate=SAMPLE_RATE, samples=None):
+        self.velocities = np.array(sorted(velocities), dtype=np.float32)
+        self.seconds = seconds
+        self.sample_rate = sample_rate
+        self.frames = int(round(seconds * sample_rate))
+        self.release_frames = int(round(release * sample_rate))
+        self.path = None
+        if samples is None:
+            self.samples = np.zeros((len(self.velocities), 128, self.frames, 2), dtype=np.float32)
+            self._rendered = np.zeros((len(self.velocities), 128), dtype=bool)
+        else:
+            self.samples = samples
+            self._rendered = np.ones((len(self.velocities), 128), dtype=bool)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def index_path(path):
+        """Location of the JSON index that describes a bank file"""
+        return Path(path).with_suffix(".json")
+
+    @classmethod
+    def build(cls, soundfont, path, velocities=NOTE_BANK_VELOCITIES, seconds=NOTE_BANK_SECONDS,
+              sample_rate=SAMPLE_RATE):
+        """Render every note of a SoundFont into a float32 .npy file with a JSON offset index
+
+        The array has shape (velocity layers, 128 notes, frames, 2 channels) and is
+        written through a memory map, so building never holds the bank in memory.
+        """
+        velocities = sorted(velocities)
+        frames = int(round(seconds * sample_rate))
+        pool = SynthPool(1, soundfont, None, sample_rate)
+        tmp_path = Path(path).with_suffix(".npy.tmp")
+        samples = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                            shape=(len(velocities), 128, frames, 2))
+        for layer, velocity in enumerate(velocities):
+            for note in range(128):
+                samples[layer, note] = synth_render_events([(0.0, note, velocity)], seconds, pool)[:frames]
+        samples.flush()
+        del samples
+        with open(tmp_path, "rb") as f:
+            np.lib.format.read_magic(f)
+            np.lib.format.read_array_header_1_0(f)
+            data_offset = f.tell()
+        os.replace(tmp_path, path)
+        note_bytes = frames * 2 * 4
+        index = {
+            "soundfont": os.path.abspath(soundfont),
+            "soundfont_sha256": soundfont_hash(soundfont),
+            "sample_rate": sample_rate,
+            "velocities": velocities,
+            "seconds": seconds,
+            "frames": frames,
+            "shape": [len(velocities), 128, frames, 2],
+            "dtype": "float32",
+            # Byte offset of (layer, note) = data_offset + (layer * 128 + note) * note_bytes
+            "data_offset": data_offset,
+            "note_bytes": note_bytes,
+        }
+        cls.index_path(path).write_text(json.dumps(index, indent=2))
+        return index
+
+    @classmethod
+    def load(cls, path, soundfont=SOUNDFONT_PATH, sample_rate=SAMPLE_RATE):
+        """Memory-map a built bank read-only after checking it matches the SoundFont
+
+        Every worker process that maps the same file shares its pages through
+        the OS page cache instead of holding its own copy.
+        """
+        index = json.loads(cls.index_path(path).read_text())
+        if index["soundfont_sha256"] != soundfont_hash(soundfont):
+            raise ValueError(f"Note bank {path} was built from a different SoundFont than {soundfont}")
+        if index["sample_rate"] != sample_rate:
+            raise ValueError(f"Note bank {path} is {index['sample_rate']} Hz, expected {sample_rate} Hz")
+        samples = np.load(path, mmap_mode="r")
+        if list(samples.shape) != index["shape"]:
+            raise ValueError(f"Note bank {path} does not match its index")
+        bank = cls(index["velocities"], index["seconds"], sample_rate=sample_rate, samples=samples)
+        bank.path = str(path)
+        return bank
+
+    def _ensure(self, layers, notes):
+        """Render any (layer, note) buffers that are still missing"""
+        missing = ~self._rendered[layers, notes]
+        if not missing.any():
+            return
+        with self._lock:
+            for layer, note in set(zip(layers[missing].tolist(), notes[missing].tolist())):
+                if self._rendered[layer, note]:
+                    continue
+                velocity = int(self.velocities[layer])
+                self.samples[layer, note] = synth_render_events([(0.0, note, velocity)], self.seconds)[:self.frames]
+                self._rendered[layer, note] = True
+
+    def layers(self, velocities):
+        """Nearest velocity layer for each velocity and the gain that matches its loudness"""
+        velocities = np.asarray(velocities, dtype=np.float32)
+        layers = np.abs(velocities[:, None] - self.velocities[None, :]).argmin(axis=1)
+        return layers, velocities / self.velocities[layers]
+
+    def envelope(self, hold_frames):
+        """Gain envelope that holds for hold_frames then fades out over the release"""
+        hold_frames = min(hold_frames, self.frames - self.release_frames)
+        fade = np.linspace(1.0, 0.0, self.release_frames, endpoint=False, dtype=np.float32)
+        return np.concatenate([np.ones(hold_frames, dtype=np.float32), fade])
+
+    def _groups(self, voices):
+        """Group (start_frame, hold_frames, note, velocity) voices that start and stop together"""
+        groups = {}
+        for start, hold, note, velocity in voices:
+            groups.setdefault((start, hold), []).append((note, velocity))
+        prepared = []
+        for (start, hold), members in sorted(groups.items()):
+            notes = np.array([note for note, _ in members])
+            layers, gains = self.layers([velocity for _, velocity in members])
+            self._ensure(layers, notes)
+            prepared.append((start, self.envelope(hold), notes, layers, gains))
+        return prepared
+
+    def mix(self, groups, start, end):
+        """Mix prepared voice groups into the (end - start, 2) window of the output
+
+        The notes of a group, such as a chord, are summed in one fancy-indexed
+        NumPy reduction and then offset-added into the window.
+        """
+        out = np.zeros((end - start, 2), dtype=np.float32)
+        for voice_start, envelope, notes, layers, gains in groups:
+            lo = max(voice_start, start)
+            hi = min(voice_start + len(envelope), end)
+            if hi <= lo:
+                continue
+            segment = self.samples[layers, notes, lo - voice_start:hi - voice_start]
+            out[lo - start:hi - start] += (np.einsum("v,vfc->fc", gains, segment)
+                                           * envelope[lo - voice_start:hi - voice_start, None])
+        return soft_limit(out)
+
+    def _voices(self, events, total_frames):
+        """Pair note ons with their note offs as (start_frame, hold_frames, note, velocity)"""
+        voices = []
+        sounding = {}
+        for seconds, note, velocity in sorted(events, key=lambda e: (e[0], e[2] > 0)):
+            frame = int(round(seconds * self.sample_rate))
+            if note in sounding:
+                start, held_velocity = sounding.pop(note)
+                voices.append((start, frame - start, note, held_velocity))
+            if velocity:
+                sounding[note] = (frame, velocity)
+        for note, (start, velocity) in sounding.items():
+            voices.append((start, total_frames - start, note, velocity))
+        return voices
+
+    def iter_render(self, events, total_seconds, split_seconds=()):
+        """Render (seconds, note, velocity) events as chunks ending at each split point"""
+        total_frames = int(round(total_seconds * self.sample_rate))
+        groups = self._groups(self._voices(events, total_frames))
+        splits = sorted({min(int(round(x * self.sample_rate)), total_frames) for x in split_seconds} | {total_frames})
+        start = 0
+        for split in splits:
+            if split > start:
+                yield self.mix(groups, start, split)
+                start = split
+
+    def stats(self):
+        """How much of the bank has been rendered"""
+        return {"velocities": self.velocities.astype(int).tolist(), "seconds": self.seconds,
+                "rendered_notes": int(self._rendered.sum()), "bytes": int(self.samples.nbytes),
+                "file": self.path}
+
+_note_bank = None
+
+def get_note_bank():
+    """Get the process-wide note bank, mapping the built bank file when there is a valid one"""
+    global _note_bank
+    with _synth_pool_lock:
+        if _note_bank is None:
+            if os.path.exists(NOTE_BANK_PATH):
+                try:
+                    _note_bank = NoteBank.load(NOTE_BANK_PATH)
+                    print(f"🎹 Mapped note bank {NOTE_BANK_PATH}")
+                except Exception as e:
+                    print(f"⚠️ Ignoring note bank {NOTE_BANK_PATH}: {e}")
+            if _note_bank is None:
+                _note_bank = NoteBank()
+        return _note_bank
+
+_soundfont_hashes = {}
+
+def soundfont_hash(path=SOUNDFONT_PATH):
+    """SHA-256 of a SoundFont file, recomputed only when the file changes"""
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if signature not in _soundfont_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _soundfont_hashes[signature] = digest.hexdigest()
+    return _soundfont_hashes[signature]
+
+class RenderCache:
+    """Content-addressed cache of rendered PCM
+
+    An in-memory LRU bounded by a byte budget sits in front of a size-bounded
+    directory of .npy files that survives restarts. Disk hits are promoted to
+    memory; the oldest files are deleted when the disk tier outgrows its budget.
+    """
+
+    def __init__(self, memory_bytes, disk_bytes, directory):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = Path(directory)
+        self._entries = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = None  # Measured on first disk write
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                         "memory_evictions": 0, "disk_evictions": 0}
+
+    @staticmethod
+    def key(kind, notes, duration, velocity):
+        """Cache key for a render of `notes` held for `duration` seconds at `velocity`
+
+        Besides the SoundFont it covers every setting that changes the rendered
+        samples, so changing configuration never serves old audio from disk.
+        """
+        identity = [kind, list(notes), round(float(duration), 6), int(velocity), soundfont_hash(), SAMPLE_RATE,
+                    RELEASE_TAIL, RENDER_BACKEND]
+        if RENDER_BACKEND == "bank":
+            identity += [list(NOTE_BANK_VELOCITIES), NOTE_BANK_SECONDS, NOTE_BANK_RELEASE]
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.npy"
+
+    def _remember(self, key, pcm):
+        """Insert into the memory tier, evicting least recently used entries over budget"""
+        if pcm.nbytes > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = pcm
+            self._memory_used += pcm.nbytes
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_used -= evicted.nbytes
+                self.counters["memory_evictions"] += 1
+
+    def _disk_usage(self):
+        return sum(f.stat().st_size for f in self.directory.glob("*/*.npy"))
+
+    def _store(self, key, pcm):
+        """Write to the disk tier atomically, then trim the oldest files over budget"""
+        path = self._path(key)
+        if self.disk_bytes <= 0 or path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, pcm)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = self._disk_usage()
+            else:
+                self._disk_used += path.stat().st_size
+            if self._disk_used <= self.disk_bytes:
+                return
+            files = sorted(self.directory.glob("*/*.npy"), key=lambda f: f.stat().st_mtime)
+            for old in files:
+                if self._disk_used <= self.disk_bytes * 0.9:
+                    break
+                try:
+                    size = old.stat().st_size
+                    old.unlink()
+                except OSError:
+                    continue
+                self._disk_used -= size
+                self.counters["disk_evictions"] += 1
+
+    def get(self, key):
+        """Look up a render, returning (pcm, tier) or (None, "miss")"""
+        with self._lock:
+            pcm = self._entries.get(key)
+            if pcm is not None:
+                self._entries.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return pcm, "memory"
+        path = self._path(key)
+        try:
+            pcm = np.load(path)
+            os.utime(path)  # Keep recently used files out of disk eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.counters["misses"] += 1
+            return None, "miss"
+        pcm.setflags(write=False)
+        self._remember(key, pcm)
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        return pcm, "disk"
+
+    def put(self, key, pcm):
+        """Store a render in both tiers"""
+        pcm.setflags(write=False)
+        self._remember(key, pcm)
+        try:
+            self._store(key, pcm)
+        except OSError as e:
+            print(f"⚠️ Audio cache write failed: {e}")
+
+    def get_or_render(self, kind, notes, duration, velocity, render):
+        """Return (pcm, tier), calling render() only on a miss"""
+        key = self.key(kind, notes, duration, velocity)
+        pcm, tier = self.get(key)
+        if pcm is None:
+            pcm = render()
+            self.put(key, pcm)
+        return pcm, tier
+
+    def stats(self):
+        """Hit, miss and eviction counters with current tier usage"""
+        with self._lock:
+            return dict(self.counters,
+                        memory_entries=len(self._entries),
+                        memory_bytes=self._memory_used,
+                        memory_budget_bytes=self.memory_bytes,
+                        disk_bytes=self._disk_used,
+                        disk_budget_bytes=self.disk_bytes)
+
+render_cache = RenderCache(AUDIO_CACHE_MEMORY_BYTES, AUDIO_CACHE_DISK_BYTES, AUDIO_CACHE_DIR)
+
+def pcm_to_int16(pcm):
+    """Convert float32 PCM to little-endian 16-bit samples"""
+    return (np.clip(pcm, -1.0, 1.0) * 32767).astype("<i2")
+
+def wav_stream_header(sample_rate=SAMPLE_RATE):
+    """WAV header for a stream of unknown length, as used for chunked responses"""
+    unknown = 0xFFFFFFFF
+    return (b"RIFF" + struct.pack("<I", unknown) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 2, sample_rate, sample_rate * 4, 4, 16)
+            + b"data" + struct.pack("<I", unknown))
+
+def buffered(iterator, size=STREAM_BUFFER_CHUNKS):
+    """Run an iterator on a background thread, keeping at most `size` items queued ahead
+
+    Rendering stays a few chunks ahead of the network while memory stays
+    bounded however long the song is. Closing the returned generator stops
+    the producer.
+    """
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def offer(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        last = done
+        try:
+            for item in iterator:
+                if not offer(item):
+                    return
+        except Exception as e:
+            last = e
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+        offer(last)
+
+    threading.Thread(target=produce, daemon=True, name="chords-render-ahead").start()
     try:
-        import mido
-        
-        # Create MIDI file
-        mid = mido.MidiFile()
-        track = mido.MidiTrack()
-        mid.tracks.append(track)
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def encode_audio(pcm, audio_format=AUDIO_FORMAT):
+    """Encode float32 stereo PCM as WAV or FLAC bytes"""
+    samples = pcm_to_int16(pcm)
+    buffer = io.BytesIO()
+    if audio_format == "flac":
+        import soundfile
+        soundfile.write(buffer, samples, SAMPLE_RATE, format="FLAC")
+    else:
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+def audio_response(pcm, audio_format=AUDIO_FORMAT):
+    """Package rendered PCM for a JSON response"""
+    if audio_format not in AUDIO_MIME_TYPES:
+        audio_format = "wav"
+    return {
+        "format": audio_format,
+        "mime_type": AUDIO_MIME_TYPES[audio_format],
+        "seconds": round(len(pcm) / SAMPLE_RATE, 3),
+        "data": base64.b64encode(encode_audio(pcm, audio_format)).decode("ascii"),
+    }
+
+def render_chord_audio(chord_notes, duration=2.5, velocity=96, audio_format=AUDIO_FORMAT):
+    """Render a chord offline and return it as encoded audio"""
+    try:
+        start = time.perf_counter()
+        pcm, tier = render_cache.get_or_render(
+            "chord", sorted(chord_notes), duration, velocity,
+            lambda: render_events(chord_events(chord_notes, 0.0, duration, velocity), duration + RELEASE_TAIL))
+        return {"success": True, "method": "offline", "audio": audio_response(pcm, audio_format),
+                "cache": tier, "render_ms": round((time.perf_counter() - start) * 1000, 3)}
+    except Exception as e:
+        print(f"⚠️ Offline render failed: {e}")
+        return {"success": False, "error": str(e), "method": "offline"}
+
+def compile_progression(progression, ticks_per_beat=TICKS_PER_BEAT, velocity=96):
+    """Compile a progression into a tick-resolution note event list
+
+    Each step is {"notes": [...], "beats": n} with an optional "velocity".
+    Steps follow each other without gaps and every note ends exactly where its
+    step ends. Returns (events, total_ticks) where events are sorted
+    (tick, note, velocity) tuples and velocity 0 marks a note off.
+    """
+    events = []
+    beats = 0.0
+    tick = 0
+    for step in progression:
+        step_velocity = step.get("velocity", velocity)
+        beats += step["beats"]
+        # Round the running position, not each step, so long songs don't drift
+        end = int(round(beats * ticks_per_beat))
+        for note in step["notes"]:
+            events.append((tick, note, step_velocity))
+            events.append((end, note, 0))
+        tick = end
+    events.sort(key=lambda e: (e[0], e[2] > 0))
+    return events, tick
+
+def progression_markers(progression, ticks_per_beat=TICKS_PER_BEAT):
+    """(tick, marker) for every step that carries a "marker" payload, e.g. the start of a bar"""
+    markers = []
+    beats = 0.0
+    for step in progression:
+        if "marker" in step:
+            markers.append((int(round(beats * ticks_per_beat)), step["marker"]))
+        beats += step["beats"]
+    return markers
+
+def ticks_to_seconds(tick, bpm, ticks_per_beat=TICKS_PER_BEAT):
+    """Convert a tick position to seconds at a fixed tempo"""
+    return tick * 60.0 / (bpm * ticks_per_beat)
+
+def render_sequence(events, total_ticks, bpm, ticks_per_beat=TICKS_PER_BEAT):
+    """Render compiled events offline, placing each one on its exact sample"""
+    timed = [(ticks_to_seconds(tick, bpm, ticks_per_beat), note, velocity) for tick, note, velocity in events]
+    return render_events(timed, ticks_to_seconds(total_ticks, bpm, ticks_per_beat) + RELEASE_TAIL)
+
+def play_sequence(events, total_ticks, bpm, ticks_per_beat=TICKS_PER_BEAT, markers=(), progress=None):
+    """Schedule compiled events on one pooled synth with FluidSynth's sequencer
+
+    The sequencer is clocked by the synth's own sample counter, so timing
+    does not depend on Python waking up on time; the thread only wakes to
+    report each marker through progress("bar", **marker) as it is reached.
+    """
+    try:
+        import fluidsynth
         
-        # Set tempo
-        track.append(mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(120)))
+        pool = get_synth_pool()
+        ticks_per_second = bpm * ticks_per_beat / 60.0
+        lead_in = 0.05  # Seconds of headroom so the first events are not scheduled in the past
+        with pool.synth() as (fs, channel, wait):
+            seq = fluidsynth.Sequencer(time_scale=ticks_per_second, use_system_timer=False)
+            try:
+                dest = seq.register_fluidsynth(fs)
+                start = seq.get_tick() + int(lead_in * ticks_per_second)
+                for tick, note, velocity in events:
+                    if velocity:
+                        seq.note_on(time=start + tick, absolute=True, channel=channel, key=note, velocity=velocity, dest=dest)
+                    else:
+                        seq.note_off(time=start + tick, absolute=True, channel=channel, key=note, dest=dest)
+                started = time.perf_counter() + lead_in
+                for tick, marker in markers:
+                    delay = started + ticks_to_seconds(tick, bpm, ticks_per_beat) - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if progress:
+                        progress("bar", **marker)
+                end = started + ticks_to_seconds(total_ticks, bpm, ticks_per_beat) + RELEASE_TAIL
+                time.sleep(max(0.0, end - time.perf_counter()))
+            finally:
+                seq.delete()
         
-        # Add note on messages
-        for note in chord_notes:
-            track.append(mido.Message("note_on", note=note, velocity=velocity, time=0))
+        return {"success": True, "method": "sequencer", "driver": pool.driver, "pool_wait_ms": round(wait * 1000, 3)}
         
-        # Calculate time for note duration (in MIDI ticks)
-        note_duration = int(mido.bpm2tempo(120) * duration / 60)
+    except Exception as e:
+        print(f"⚠️ Sequencer playback failed: {e}")
+        return {"success": False, "error": str(e), "method": "sequencer"}
+
+_worker_pool = None
+
+def _init_render_worker(soundfont, sample_rate):
+    """Start one warm offline synth in a render farm process"""
+    global _worker_pool
+    _worker_pool = SynthPool(1, soundfont, None, sample_rate)
+    _worker_pool.warm()
+
+def _render_segment(events, total_seconds):
+    """Render one segment of a progression in a render farm process"""
+    return synth_render_events(events, total_seconds, _worker_pool)
+
+_render_farm = None
+
+def get_render_farm(processes=None):
+    """Get this process's one pool of warm FluidSynth workers, starting it on first use
+
+    `processes` (RENDER_PROCESSES by default) only counts when the farm is started.
+    """
+    global _render_farm
+    with _synth_pool_lock:
+        if _render_farm is None:
+            # Spawned rather than forked: forking a process that already runs audio threads is unsafe
+            _render_farm = ProcessPoolExecutor(max_workers=processes or RENDER_PROCESSES,
+                                               mp_context=multiprocessing.get_context("spawn"),
+                                               initializer=_init_render_worker,
+                                               initargs=(SOUNDFONT_PATH, SAMPLE_RATE))
+        return _render_farm
+
+def split_progression(steps, bpm, velocity=96, segment_steps=RENDER_SEGMENT_STEPS):
+    """Cut progression steps into independently renderable segments
+
+    Returns (start_seconds, events, seconds) per segment, with event times
+    relative to the segment start. Every note ends on a step boundary, so no
+    note crosses a segment; each segment renders RELEASE_TAIL past its end so
+    its release can be overlap-added onto the next one.
+    """
+    segments = []
+    beats = 0.0
+    for first in range(0, len(steps), segment_steps):
+        segment = steps[first:first + segment_steps]
+        events, total_ticks = compile_progression(segment, velocity=velocity)
+        timed = [(ticks_to_seconds(tick, bpm), note, vel) for tick, note, vel in events]
+        segments.append((beats * 60.0 / bpm, timed, ticks_to_seconds(total_ticks, bpm) + RELEASE_TAIL))
+        beats += sum(step["beats"] for step in segment)
+    return segments, beats * 60.0 / bpm + RELEASE_TAIL
+
+def render_progressions_parallel(progressions, segment_steps=RENDER_SEGMENT_STEPS):
+    """Render many (steps, bpm, velocity) progressions across the render farm
+
+    All segments of all progressions are queued at once so every core stays
+    busy; each progression is then stitched by overlap-adding its segments at
+    their start frames.
+    """
+    farm = get_render_farm()
+    plans = []
+    for steps, bpm, velocity in progressions:
+        segments, total_seconds = split_progression(steps, bpm, velocity, segment_steps)
+        futures = [(start, farm.submit(_render_segment, events, seconds)) for start, events, seconds in segments]
+        plans.append((futures, total_seconds))
+    results = []
+    for futures, total_seconds in plans:
+        out = np.zeros((int(round(total_seconds * SAMPLE_RATE)), 2), dtype=np.float32)
+        for start, future in futures:
+            segment = future.result()
+            offset = int(round(start * SAMPLE_RATE))
+            length = min(len(segment), len(out) - offset)
+            out[offset:offset + length] += segment[:length]
+        results.append(out)
+    return results
+
+def render_progression(steps, bpm, velocity=96):
+    """Render progression steps offline, across the render farm when that pays off"""
+    if RENDER_BACKEND != "bank" and RENDER_PROCESSES > 1 and len(steps) >= RENDER_PARALLEL_MIN_STEPS:
+        return render_progressions_parallel([(steps, bpm, velocity)])[0]
+    events, total_ticks = compile_progression(steps, velocity=velocity)
+    return render_sequence(events, total_ticks, bpm)
+
+def perform_sequence(steps, bpm, velocity=96, audio_mode=AUDIO_MODE, audio_format=AUDIO_FORMAT, progress=None):
+    """Play progression steps on the server, or render them offline when audio_mode says so"""
+    if audio_mode != "offline":
+        events, total_ticks = compile_progression(steps, velocity=velocity)
+        return play_sequence(events, total_ticks, bpm, markers=progression_markers(steps), progress=progress)
+    try:
+        start = time.perf_counter()
+        pcm = render_progression(steps, bpm, velocity)
+        if progress:
+            progress("rendered", seconds=round(len(pcm) / SAMPLE_RATE, 3))
+        return {"success": True, "method": "offline", "audio": audio_response(pcm, audio_format),
+                "render_ms": round((time.perf_counter() - start) * 1000, 3)}
+    except Exception as e:
+        print(f"⚠️ Offline render failed: {e}")
+        return {"success": False, "error": str(e), "method": "offline"}
+
+class ArtifactStore:
+    """Downloadable files stored under the SHA-256 of their content
+
+    Identical content always maps to the same file, so repeated exports share
+    it and concurrent requests never overwrite each other's downloads. Files
+    expire ARTIFACT_TTL seconds after they were last produced and the oldest
+    are dropped when the store outgrows its byte budget.
+    """
+
+    DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+    def __init__(self, directory, ttl, max_bytes, prune_interval=60.0):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+
+    def put(self, data, suffix):
+        """Store bytes and return their hex digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.directory / f"{digest}{suffix}"
+        # Under prune()'s lock, so a file can't be pruned between finding it and touching it
+        with self._lock:
+            try:
+                os.utime(path)  # Produced again: restart its TTL
+            except FileNotFoundError:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.directory / f".{digest}.{uuid.uuid4().hex}.tmp"
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+        if time.monotonic() - self._last_prune > self.prune_interval:
+            self.prune()
+        return digest
+
+    def path(self, digest, suffix):
+        """Path of a stored artifact, or None if the digest is malformed or unknown"""
+        if not self.DIGEST.match(digest):
+            return None
+        path = self.directory / f"{digest}{suffix}"
+        return path if path.exists() else None
+
+    def prune(self):
+        """Delete expired artifacts, then the oldest ones until under the byte budget"""
+        with self._lock:
+            self._last_prune = time.monotonic()
+            cutoff = time.time() - self.ttl
+            files = []
+            for path in self.directory.glob("*.*"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if stat.st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+artifact_store = ArtifactStore(ARTIFACT_DIR, ARTIFACT_TTL, ARTIFACT_MAX_BYTES)
+
+class LLMCache:
+    """Model answers kept in SQLite, keyed by question, prompt version and model
+
+    Entries never expire on their own: a stale one is still served while a
+    background thread asks the model again, so callers only wait on OpenAI
+    when they choose to. Changing the prompt version or model simply misses.
+    Each thread keeps its own connection; WAL mode lets gunicorn workers share
+    the file.
+    """
+
+    def __init__(self, path, refresh_workers=LLM_REFRESH_WORKERS):
+        self.path = path
+        self.counters = {"hits": 0, "stale_hits": 0, "fuzzy_hits": 0, "misses": 0, "refreshes": 0,
+                         "refresh_failures": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="chords-llm-refresh")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""CREATE TABLE IF NOT EXISTS llm_answers (
+                kind TEXT NOT NULL, key TEXT NOT NULL, prompt_version INTEGER NOT NULL, model TEXT NOT NULL,
+                value TEXT NOT NULL, created REAL NOT NULL,
+                PRIMARY KEY (kind, key, prompt_version, model))""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS llm_trigrams (
+                kind TEXT NOT NULL, trigram TEXT NOT NULL, key TEXT NOT NULL, trigrams INTEGER NOT NULL,
+                PRIMARY KEY (kind, trigram, key))""")
+            self._local.connection = connection
+        return connection
+
+    def get(self, kind, key, prompt_version, model, ttl):
+        """Look up an answer, returning (value, stale) or (None, False)"""
+        row = self._connection().execute(
+            "SELECT value, created FROM llm_answers WHERE kind = ? AND key = ? AND prompt_version = ? AND model = ?",
+            (kind, key, prompt_version, model)).fetchone()
+        if row is None:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None, False
+        stale = time.time() - row[1] > ttl
+        with self._lock:
+            self.counters["stale_hits" if stale else "hits"] += 1
+        return json.loads(row[0]), stale
+
+    def put(self, kind, key, prompt_version, model, value, index=False):
+        """Store an answer, replacing any earlier one; index=True makes the key findable by find_similar()"""
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_answers (kind, key, prompt_version, model, value, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, prompt_version, model, json.dumps(value), time.time()))
+            if index:
+                trigrams = title_trigrams(key)
+                connection.executemany(
+                    "INSERT OR REPLACE INTO llm_trigrams (kind, trigram, key, trigrams) VALUES (?, ?, ?, ?)",
+                    [(kind, trigram, key, len(trigrams)) for trigram in trigrams])
+
+    def find_similar(self, kind, key, prompt_version, model, threshold, accept=None):
+        """The indexed key most similar to `key` (Jaccard similarity of their trigrams), or None below threshold
+
+        Only keys with an answer for this prompt version and model count, and
+        only those accept(candidate) approves when it is given.
+        """
+        trigrams = title_trigrams(key)
+        if not trigrams:
+            return None
+        placeholders = ",".join("?" * len(trigrams))
+        rows = self._connection().execute(
+            f"SELECT t.key, COUNT(*), t.trigrams FROM llm_trigrams t "
+            f"JOIN llm_answers a ON a.kind = t.kind AND a.key = t.key AND a.prompt_version = ? AND a.model = ? "
+            f"WHERE t.kind = ? AND t.trigram IN ({placeholders}) GROUP BY t.key",
+            (prompt_version, model, kind, *trigrams)).fetchall()
+        best, best_score = None, threshold
+        for candidate, shared, count in rows:
+            score = shared / (len(trigrams) + count - shared)
+            if score >= best_score and (accept is None or accept(candidate)):
+                best, best_score = candidate, score
+        if best is not None:
+            with self._lock:
+                self.counters["fuzzy_hits"] += 1
+        return best
+
+    def fresh_keys(self, kind, prompt_version, model, ttl):
+        """Keys of one kind that have an answer younger than ttl"""
+        rows = self._connection().execute(
+            "SELECT key FROM llm_answers WHERE kind = ? AND prompt_version = ? AND model = ? AND created >= ?",
+            (kind, prompt_version, model, time.time() - ttl))
+        return {key for key, in rows}
+
+    def refresh(self, kind, key, prompt_version, model, ask, index=False):
+        """Ask the model again in the background; ask() returns the value to store, or None to keep the old one"""
+        token = (kind, key, prompt_version, model)
+        with self._lock:
+            if token in self._refreshing:
+                return
+            self._refreshing.add(token)
         
-        # Add note off messages
-        track.append(mido.Message("note_off", note=chord_notes[0], velocity=0, time=note_duration))
-        for note in chord_notes[1:]:
-            track.append(mido.Message("note_off", note=note, velocity=0, time=0))
+        def run():
+            try:
+                value = ask()
+                if value is not None:
+                    self.put(kind, key, prompt_version, model, value, index=index)
+                with self._lock:
+                    self.counters["refreshes" if value is not None else "refresh_failures"] += 1
+            except Exception as e:
+                print(f"⚠️ Background refresh of {kind} '{key}' failed: {e}")
+                with self._lock:
+                    self.counters["refresh_failures"] += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(token)
         
-        # Save to temporary file
-        temp_dir = tempfile.gettempdir()
-        midi_path = os.path.join(temp_dir, "chord_output.mid")
-        mid.save(midi_path)
+        self._refresh_executor.submit(run)
+
+    def stats(self):
+        """Hit, miss and refresh counters"""
+        with self._lock:
+            return dict(self.counters, refreshing=len(self._refreshing))
+
+llm_cache = LLMCache(LLM_CACHE_PATH)
+
+# Every OpenAI call runs on one event loop with one client, so a worker keeps a
+# single pool of kept-alive connections however many calls are in flight.
+_llm_loop = None
+_llm_loop_lock = threading.Lock()
+_async_openai = None
+
+def get_llm_loop():
+    """The event loop OpenAI calls run on, started on a daemon thread on first use"""
+    global _llm_loop
+    with _llm_loop_lock:
+        if _llm_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="chords-llm-loop", daemon=True).start()
+            _llm_loop = loop
+        return _llm_loop
+
+def get_async_openai():
+    """The shared AsyncOpenAI client; only use it from coroutines running on the LLM loop"""
+    global _async_openai
+    if _async_openai is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+                                keepalive_expiry=LLM_KEEPALIVE_EXPIRY),
+            timeout=httpx.Timeout(SONG_TIMEOUT, connect=LLM_CONNECT_TIMEOUT))
+        _async_openai = openai.AsyncOpenAI(http_client=http_client, max_retries=LLM_MAX_RETRIES)
+    return _async_openai
+
+def submit_llm(coroutine):
+    """Schedule a coroutine on the LLM loop and return a concurrent.futures.Future for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_llm_loop())
+
+def call_llm(coroutine):
+    """Run a coroutine on the LLM loop and wait for it; for threads that aren't running a loop"""
+    return submit_llm(coroutine).result()
+
+async def await_llm(coroutine):
+    """Await a coroutine on the LLM loop from another event loop, such as an async view's"""
+    return await asyncio.wrap_future(submit_llm(coroutine))
+
+def write_progression_midi(steps, bpm=120, time_signature=(4, 4), ticks_per_beat=TICKS_PER_BEAT, velocity=96,
+                           midi_type=1):
+    """Encode progression steps as a Standard MIDI File with mido and return its bytes
+
+    Steps are the same {"notes": [...], "beats": n} chords the sequencer
+    plays, laid out one after another on the tick timeline; nothing touches
+    the filesystem. This is the reference for encode_progression_midi().
+    """
+    import mido
+    
+    events, total_ticks = compile_progression(steps, ticks_per_beat, velocity)
+    numerator, denominator = time_signature
+    track = mido.MidiTrack()
+    track.append(mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(bpm), time=0))
+    track.append(mido.MetaMessage("time_signature", numerator=numerator, denominator=denominator, time=0))
+    
+    # Events carry absolute ticks; MIDI files store the delta to the previous event
+    previous = 0
+    for tick, note, note_velocity in events:
+        if note_velocity:
+            track.append(mido.Message("note_on", note=note, velocity=note_velocity, time=tick - previous))
+        else:
+            track.append(mido.Message("note_off", note=note, velocity=0, time=tick - previous))
+        previous = tick
+    track.append(mido.MetaMessage("end_of_track", time=total_ticks - previous))
+    
+    mid = mido.MidiFile(type=midi_type, ticks_per_beat=ticks_per_beat)
+    mid.tracks.append(track)
+    buffer = io.BytesIO()
+    mid.save(file=buffer)
+    return buffer.getvalue()
+
+def encode_progression_midi(steps, bpm=120, time_signature=(4, 4), ticks_per_beat=TICKS_PER_BEAT, velocity=96,
+                            midi_type=1):
+    """Encode progression steps as a Standard MIDI File without building mido messages
+
+    Produces the same bytes as write_progression_midi() (single track, running
+    status on channel 0) by writing straight into a preallocated bytearray,
+    and like it raises ValueError for notes or velocities outside 0-127 and
+    tempos that don't fit in three bytes.
+    """
+    events, total_ticks = compile_progression(steps, ticks_per_beat, velocity)
+    numerator, denominator = time_signature
+    tempo = int(round(60000000 / bpm))
+    if not 0 <= tempo <= MIDI_MAX_TEMPO:
+        raise ValueError(f"tempo must be in range 0..{MIDI_MAX_TEMPO}, got {tempo}")
+    
+    # Worst case per event: 4 delta bytes plus a 3 byte channel message
+    data = bytearray(14 + 8 + 4 + 7 + 4 + 8 + 4 + 3 + len(events) * 7)
+    data[0:14] = b"MThd" + struct.pack(">Ihhh", 6, midi_type, 1, ticks_per_beat)
+    data[14:18] = b"MTrk"
+    data[22:37] = bytes((0x00, 0xFF, 0x51, 0x03, (tempo >> 16) & 0xFF, (tempo >> 8) & 0xFF, tempo & 0xFF,
+                         0x00, 0xFF, 0x58, 0x04, numerator, denominator.bit_length() - 1, 24, 8))
+    pos = 37
+    
+    previous = 0
+    running_status = None
+    for tick, note, note_velocity in events:
+        # mido rejects these too; unchecked, they would corrupt the byte stream
+        if not 0 <= note <= 127:
+            raise ValueError(f"note must be in range 0..127, got {note}")
+        if not 0 <= note_velocity <= 127:
+            raise ValueError(f"velocity must be in range 0..127, got {note_velocity}")
+        pos = _write_vlq(data, pos, tick - previous)
+        previous = tick
+        status = 0x90 if note_velocity else 0x80
+        if status != running_status:
+            data[pos] = status
+            pos += 1
+            running_status = status
+        data[pos] = note
+        data[pos + 1] = int(note_velocity)
+        pos += 2
+    pos = _write_vlq(data, pos, total_ticks - previous)
+    data[pos:pos + 3] = b"\xff\x2f\x00"
+    pos += 3
+    
+    struct.pack_into(">I", data, 18, pos - 22)
+    del data[pos:]
+    return bytes(data)
+
+def _write_vlq(data, pos, value):
+    """Write a MIDI variable-length quantity at pos and return the next free offset"""
+    if value < 0x80:
+        data[pos] = value
+        return pos + 1
+    groups = []
+    while value:
+        groups.append(value & 0x7F)
+        value >>= 7
+    for group in reversed(groups[1:]):
+        data[pos] = group | 0x80
+        pos += 1
+    data[pos] = groups[0]
+    return pos + 1
+
+def create_progression_midi_file(steps, bpm=120, time_signature=(4, 4), velocity=96):
+    """Create a downloadable MIDI file for a progression"""
+    try:
+        digest = artifact_store.put(encode_progression_midi(steps, bpm, time_signature, velocity=velocity), ".mid")
         
-        return {"success": True, "method": "midi", "file_path": midi_path}
+        return {"success": True, "method": "midi", "file_path": str(artifact_store.path(digest, ".mid")),
+                "hash": digest, "download_url": f"/download_midi/{digest}"}
         
     except Exception as e:
         return {"success": False, "error": str(e), "method": "midi"}
 
+def create_midi_file(chord_notes, duration=2.5, velocity=96):
+    """Create MIDI file as fallback when audio fails"""
+    # At 120 BPM a beat lasts half a second
+    return create_progression_midi_file([{"notes": chord_notes, "beats": duration * 2}], 120, velocity=velocity)
+
 def get_chord_notes(chord_type, root_note="C"):
     """Get MIDI note numbers for common chord types"""
-    # Root note to MIDI number mapping (C4 = 60)
-    root_notes = {"C": 60, "C#": 61, "D": 62, "D#": 63, "E": 64, "F": 65, 
-                  "F#": 66, "G": 67, "G#": 68, "A": 69, "A#": 70, "B": 71}
-    
-    root = root_notes.get(root_note.upper(), 60)
+    # Root position above C4 = 60; unknown roots fall back to C
+    root = 60 + NOTE_INDEX.get(root_note[:1].upper() + root_note[1:], 0)
     
-    chord_patterns = {
-        "major": [0, 4, 7],           # Root, Major 3rd, Perfect 5th
-        "minor": [0, 3, 7],           # Root, Minor 3rd, Perfect 5th
-        "diminished": [0, 3, 6],      # Root, Minor 3rd, Diminished 5th
-        "augmented": [0, 4, 8],       # Root, Major 3rd, Augmented 5th
-        "major7": [0, 4, 7, 11],     # Major 7th chord
-        "minor7": [0, 3, 7, 10],     # Minor 7th chord
-        "dominant7": [0, 4, 7, 10],  # Dominant 7th chord
-        "diminished7": [0, 3, 6, 9], # Diminished 7th chord
-        "power": [0, 7],              # Power chord (root + 5th)
-    }
-    
-    if chord_type not in chord_patterns:
-        chord_type = "major"  # Default to major
-    
-    return [root + interval for interval in chord_patterns[chord_type]]
+    # Default to major
+    return [root + interval for interval in CHORD_MASKS.get(chord_type, CHORD_MASKS["major"]).intervals()]
 
 @app.route('/')
 def index():
@@ -215,16 +1606,29 @@ def generate_chord():
         chord_type = data.get('chord_type', 'major')
         duration = float(data.get('duration', 2.5))
         velocity = int(data.get('velocity', 96))
+        audio_mode = data.get('audio_mode', AUDIO_MODE)
+        audio_format = data.get('audio_format', AUDIO_FORMAT)
+        try:
+            root_note, chord_type = normalize_scale_chord(root_note, chord_type)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         
         # Get chord notes
         chord_notes = get_chord_notes(chord_type, root_note)
         note_names = [get_note_name(note) for note in chord_notes]
         
-        # Analyze scales for this chord
-        scale_analysis = analyze_scales_for_chord(root_note, chord_type)
+        # Suggest scales for this chord while the audio is produced
+        start = time.perf_counter()
+        scale_source = data.get('scale_source', SCALE_SOURCE)
+        scale_future = submit_scale_suggestions(root_note, chord_type, scale_source)
         
         # Try to generate audio first
-        audio_result = generate_chord_audio(chord_notes, duration, velocity)
+        if audio_mode == "offline":
+            audio_result = render_chord_audio(chord_notes, duration, velocity, audio_format)
+        else:
+            audio_result = generate_chord_audio(chord_notes, duration, velocity)
+        
+        scales = collect_scales(scale_future, start, root_note, chord_type, scale_source)
         
         if audio_result["success"]:
             # Audio succeeded
@@ -234,10 +1638,12 @@ def generate_chord():
                 "note_names": note_names,
                 "chord_type": chord_type,
                 "root_note": root_note,
-                "method": "audio",
-                "driver": audio_result.get("driver", "unknown"),
-                "scales": scale_analysis.get("data", {}).get("scales", []),
-                "message": f"Successfully played {root_note} {chord_type} chord: {', '.join(note_names)}"
+                "method": audio_result["method"],
+                "driver": audio_result.get("driver", "offline" if audio_mode == "offline" else "unknown"),
+                "pool_wait_ms": audio_result.get("pool_wait_ms"),
+                "audio": audio_result.get("audio"),
+                **scales,
+                "message": f"Successfully {'rendered' if audio_mode == 'offline' else 'played'} {root_note} {chord_type} chord: {', '.join(note_names)}"
             }
         else:
             # Audio failed, try MIDI
@@ -252,7 +1658,8 @@ def generate_chord():
                     "root_note": root_note,
                     "method": "midi",
                     "file_path": midi_result["file_path"],
-                    "scales": scale_analysis.get("data", {}).get("scales", []),
+                    "download_url": midi_result["download_url"],
+                    **scales,
                     "message": f"Audio failed, created MIDI file for {root_note} {chord_type} chord: {', '.join(note_names)}"
                 }
             else:
@@ -263,7 +1670,7 @@ def generate_chord():
                     "note_names": note_names,
                     "chord_type": chord_type,
                     "root_note": root_note,
-                    "scales": scale_analysis.get("data", {}).get("scales", []),
+                    **scales,
                     "error": f"Audio: {audio_result.get('error', 'Unknown')}, MIDI: {midi_result.get('error', 'Unknown')}",
                     "message": f"Failed to generate audio or MIDI for {root_note} {chord_type} chord"
                 }
@@ -277,57 +1684,227 @@ def generate_chord():
             "message": "An error occurred while processing the request"
         })
 
-@app.route('/play_12bar_blues', methods=['POST'])
-def play_12bar_blues():
-    """Play a 12-bar blues progression in the chosen key"""
+scale_executor = ThreadPoolExecutor(max_workers=SCALE_WORKERS, thread_name_prefix="chords-scales")
+_scale_futures = {}
+_scale_futures_lock = threading.Lock()
+
+def submit_scale_suggestions(root_note, chord_type, source=SCALE_SOURCE):
+    """Start a scale lookup on the scale executor, or join one already running for the same chord"""
+    key = (root_note, chord_type, source)
+    with _scale_futures_lock:
+        future = _scale_futures.get(key)
+        if future is not None:
+            return future
+        future = scale_executor.submit(get_scale_suggestions, root_note, chord_type, source)
+        _scale_futures[key] = future
+    
+    def forget(done):
+        with _scale_futures_lock:
+            if _scale_futures.get(key) is done:
+                del _scale_futures[key]
+    
+    future.add_done_callback(forget)
+    return future
+
+def collect_scales(future, start, root_note, chord_type, source=SCALE_SOURCE):
+    """Response fields for a scale lookup, waiting until SCALE_BUDGET_MS after `start` at most
+
+    A lookup that misses the budget keeps running; the response then says
+    "scales_pending" and where to fetch them.
+    """
+    remaining = SCALE_BUDGET_MS / 1000 - (time.perf_counter() - start)
+    try:
+        scale_analysis = future.result(timeout=max(remaining, 0))
+    except concurrent.futures.TimeoutError:
+        query = urlencode({"root_note": root_note, "chord_type": chord_type, "scale_source": source})
+        return {"scales": [], "scales_pending": True, "scales_url": f"/scales?{query}"}
+    except Exception as e:
+        print(f"⚠️ Scale lookup failed: {e}")
+        scale_analysis = get_fallback_scales(root_note, chord_type)
+    return {"scales": scale_analysis.get("data", {}).get("scales", []), "scales_pending": False}
+
+@app.route('/scales')
+def scales():
+    """Scales for a chord, joining the lookup /generate_chord started if it is still running"""
+    try:
+        root_note = request.args.get('root_note', 'C')
+        chord_type = request.args.get('chord_type', 'major')
+        source = request.args.get('scale_source', SCALE_SOURCE)
+        try:
+            root_note, chord_type = normalize_scale_chord(root_note, chord_type)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        scale_analysis = submit_scale_suggestions(root_note, chord_type, source).result(timeout=SCALE_FOLLOWUP_TIMEOUT)
+        return jsonify({
+            "success": True,
+            "root_note": root_note,
+            "chord_type": chord_type,
+            "source": scale_analysis.get("source"),
+            "scales": scale_analysis.get("data", {}).get("scales", [])
+        })
+    except concurrent.futures.TimeoutError:
+        return jsonify({"success": False, "error": "Scale lookup timed out"}), 504
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+VOICING_REGISTER_WEIGHT = 0.25  # cost per semitone a voicing's average sits away from VOICING_CENTER
+VOICING_BLOCK = 128  # chord transitions costed per NumPy expression, bounding its memory
+
+def _chord_pitch_class_key(chord_notes):
+    return tuple(dict.fromkeys(note % 12 for note in chord_notes))
+
+@functools.lru_cache(maxsize=1024)
+def voicing_candidates(pitch_classes, low=VOICING_LOW):
+    """Every inversion of a chord in close position, starting in the octave from `low` or the one above
+
+    Takes the chord's pitch classes root first and returns a read-only
+    (candidates, notes) array.
+    """
+    pitch_classes = list(pitch_classes)
+    candidates = []
+    for inversion in range(len(pitch_classes)):
+        order = pitch_classes[inversion:] + pitch_classes[:inversion]
+        voicing = [low + (order[0] - low) % 12]
+        for pitch_class in order[1:]:
+            voicing.append(voicing[-1] + (pitch_class - voicing[-1] - 1) % 12 + 1)
+        candidates.append(voicing)
+        candidates.append([note + 12 for note in voicing])
+    candidates = np.array(candidates, dtype=float)
+    candidates.flags.writeable = False
+    return candidates
+
+def _voicing_transition_costs(current, following):
+    """Voice movement from every voicing in `current` to every voicing in `following`
+
+    Both are (T, C, N) arrays of candidate voicings padded with NaN. Each note
+    is matched to the nearest note of the other chord in both directions, so
+    chords of different sizes compare fairly. Returns a (T, C, C) array that
+    is inf wherever a padded candidate is involved.
+    """
+    count, width = current.shape[1:]
+    forward = np.full((len(current), count, count, width), np.inf)
+    backward = np.full_like(forward, np.inf)
+    # One pass per voice keeps the intermediates at (T, C, C, N) rather than (T, C, C, N, N)
+    for voice in range(width):
+        np.fmin(forward, np.abs(current[:, :, None, :] - following[:, None, :, voice, None]), out=forward)
+        np.fmin(backward, np.abs(following[:, None, :, :] - current[:, :, None, voice, None]), out=backward)
+    forward[np.broadcast_to(np.isnan(current)[:, :, None, :], forward.shape)] = 0.0
+    backward[np.broadcast_to(np.isnan(following)[:, None, :, :], backward.shape)] = 0.0
+    return (forward.sum(axis=3) + backward.sum(axis=3)) / 2
+
+def voice_lead(chords, low=VOICING_LOW, center=VOICING_CENTER):
+    """Revoice a progression of chords (MIDI note lists) to minimize total voice movement
+
+    Picks an inversion and octave for every chord by dynamic programming over
+    all candidate voicings, with a small pull towards `center` so long
+    progressions don't drift across the keyboard.
+    """
+    if not chords:
+        return []
+    # Progressions repeat a handful of chords, so fill the candidate array chord by distinct chord
+    rows = {}
+    for t, chord_notes in enumerate(chords):
+        rows.setdefault(_chord_pitch_class_key(chord_notes), []).append(t)
+    candidates = {key: voicing_candidates(key, low) for key in rows}
+    count = max(options.shape[0] for options in candidates.values())
+    width = max(options.shape[1] for options in candidates.values())
+    voicings = np.full((len(chords), count, width), np.nan)
+    for key, options in candidates.items():
+        voicings[rows[key], :options.shape[0], :options.shape[1]] = options
+    
+    valid = ~np.isnan(voicings)
+    sizes = valid.sum(axis=2)
+    means = np.where(valid, voicings, 0.0).sum(axis=2) / np.maximum(sizes, 1)
+    register = np.where(sizes > 0, np.abs(means - center) * VOICING_REGISTER_WEIGHT, np.inf)
+    
+    # transitions[t] is the cost of moving from chord t to chord t + 1
+    transitions = np.empty((len(chords) - 1, count, count))
+    for start in range(0, len(chords) - 1, VOICING_BLOCK):
+        end = min(start + VOICING_BLOCK, len(chords) - 1)
+        transitions[start:end] = _voicing_transition_costs(voicings[start:end], voicings[start + 1:end + 1])
+    
+    cost = register[0]
+    backpointers = np.zeros((len(chords), count), dtype=np.intp)
+    columns = np.arange(count)
+    for t in range(1, len(chords)):
+        total = cost[:, None] + transitions[t - 1]
+        backpointers[t] = total.argmin(axis=0)
+        cost = total[backpointers[t], columns] + register[t]
+    
+    choice = int(cost.argmin())
+    voiced = [None] * len(chords)
+    for t in range(len(chords) - 1, -1, -1):
+        voiced[t] = [int(note) for note in voicings[t, choice, valid[t, choice]]]
+        choice = backpointers[t, choice]
+    return voiced
+
+def build_12bar_blues(root_note, voice_leading=VOICE_LEADING):
+    """Display info and sequencer steps for a 12-bar blues in the given key"""
+    # 12-bar blues progression pattern
+    # I = root major, IV = 4th major, V = 5th major
+    blues_progression = [
+        (root_note, "major"),      # Bar 1-4: I chord
+        (root_note, "major"),      # Bar 2
+        (root_note, "major"),      # Bar 3
+        (root_note, "major"),      # Bar 4
+        (get_4th_note(root_note), "major"),      # Bar 5-6: IV chord
+        (get_4th_note(root_note), "major"),      # Bar 6
+        (root_note, "major"),      # Bar 7-8: I chord
+        (root_note, "major"),      # Bar 8
+        (get_5th_note(root_note), "major"),      # Bar 9: V chord
+        (get_4th_note(root_note), "major"),      # Bar 10: IV chord
+        (root_note, "major"),      # Bar 11-12: I chord
+        (root_note, "major")       # Bar 12
+    ]
+    
+    progression_info = []
+    steps = []
+    
+    chords = [get_chord_notes(chord_type, note) for note, chord_type in blues_progression]
+    if voice_leading:
+        chords = voice_lead(chords)
+    
+    # One 4-beat step per bar
+    for i, ((note, chord_type), chord_notes) in enumerate(zip(blues_progression, chords), 1):
+        note_names = [get_note_name(note) for note in chord_notes]
+        
+        progression_info.append({
+            "bar": i,
+            "chord": f"{note} {chord_type}",
+            "notes": note_names,
+            "midi_notes": chord_notes
+        })
+        
+        steps.append({"notes": chord_notes, "beats": 4,
+                      "marker": {"index": i - 1, "bar": i, "chord": f"{note} {chord_type}"}})
+    
+    return progression_info, steps
+
+def midi_error(audio_result, midi_result):
+    """Error of a failed progression export, naming the audio failure too if playback also failed"""
+    if audio_result["success"]:
+        return midi_result.get("error", "Unknown")
+    return f"Audio: {audio_result.get('error', 'Unknown')}, MIDI: {midi_result.get('error', 'Unknown')}"
+
+def run_12bar_blues(data, progress=None):
+    """Build, play and export a 12-bar blues, returning the response payload"""
+    progress = progress or (lambda event, **payload: None)
     try:
-        data = request.get_json()
         root_note = data.get('root_note', 'C')
         duration = float(data.get('duration', 1.0))  # Shorter duration for progression
         velocity = int(data.get('velocity', 96))
+        audio_mode = data.get('audio_mode', AUDIO_MODE)
+        audio_format = data.get('audio_format', AUDIO_FORMAT)
         
-        # 12-bar blues progression pattern
-        # I = root major, IV = 4th major, V = 5th major
-        blues_progression = [
-            (root_note, "major"),      # Bar 1-4: I chord
-            (root_note, "major"),      # Bar 2
-            (root_note, "major"),      # Bar 3
-            (root_note, "major"),      # Bar 4
-            (get_4th_note(root_note), "major"),      # Bar 5-6: IV chord
-            (get_4th_note(root_note), "major"),      # Bar 6
-            (root_note, "major"),      # Bar 7-8: I chord
-            (root_note, "major"),      # Bar 8
-            (get_5th_note(root_note), "major"),      # Bar 9: V chord
-            (get_4th_note(root_note), "major"),      # Bar 10: IV chord
-            (root_note, "major"),      # Bar 11-12: I chord
-            (root_note, "major")       # Bar 12
-        ]
-        
-        progression_info = []
-        all_notes = []
-        
-        # Play each chord in the progression
-        for i, (note, chord_type) in enumerate(blues_progression, 1):
-            chord_notes = get_chord_notes(chord_type, note)
-            note_names = [get_note_name(note) for note in chord_notes]
-            
-            progression_info.append({
-                "bar": i,
-                "chord": f"{note} {chord_type}",
-                "notes": note_names,
-                "midi_notes": chord_notes
-            })
-            
-            # Play the chord
-            audio_result = generate_chord_audio(chord_notes, duration, velocity)
-            if audio_result["success"]:
-                all_notes.extend(chord_notes)
-            else:
-                # If audio fails, just collect the notes for MIDI
-                all_notes.extend(chord_notes)
+        progression_info, progression = build_12bar_blues(root_note, data.get('voice_leading', VOICE_LEADING))
+        
+        progress("progression", root_note=root_note, progression=progression_info)
+        
+        # Each 4-beat bar lasts `duration` seconds
+        audio_result = perform_sequence(progression, 240.0 / duration, velocity, audio_mode, audio_format, progress)
         
         # Create MIDI file for the entire progression
-        midi_result = create_midi_file(all_notes, duration * 12, velocity)
+        midi_result = create_progression_midi_file(progression, 240.0 / duration, velocity=velocity)
         
         if midi_result["success"]:
             result = {
@@ -336,42 +1913,236 @@ def play_12bar_blues():
                 "root_note": root_note,
                 "method": "midi",
                 "file_path": midi_result["file_path"],
+                "download_url": midi_result["download_url"],
+                "audio": audio_result.get("audio"),
                 "message": f"Successfully played 12-bar blues in {root_note} key! Created MIDI file for download."
             }
+            if not audio_result["success"]:
+                result["audio_error"] = audio_result.get("error", "Unknown")
+                result["message"] = f"Audio failed, created MIDI file for 12-bar blues in {root_note} key"
         else:
             result = {
                 "success": False,
                 "progression": progression_info,
                 "root_note": root_note,
-                "error": midi_result.get("error", "Unknown"),
+                "error": midi_error(audio_result, midi_result),
                 "message": f"Failed to create MIDI file for 12-bar blues in {root_note} key"
             }
         
-        return jsonify(result)
+        return result
         
     except Exception as e:
-        return jsonify({
+        return {
             "success": False,
             "error": str(e),
             "message": "An error occurred while processing the 12-bar blues request"
-        })
+        }
+
+@app.route('/play_12bar_blues', methods=['POST'])
+def play_12bar_blues():
+    """Play a 12-bar blues progression in the chosen key"""
+    data = request.get_json() or {}
+    try:
+        duration = float(data.get('duration', 1.0))
+    except (TypeError, ValueError):
+        duration = 0
+    # Each 4-beat bar lasts `duration` seconds, and the MIDI file can't go slower than MIDI_MIN_BPM
+    if not 0 < duration <= 240.0 / MIDI_MIN_BPM:
+        return jsonify({"success": False,
+                        "error": f"'duration' must be a positive number of seconds up to {240.0 / MIDI_MIN_BPM:.1f}"}), 400
+    if data.get('async'):
+        return submit_job("12bar_blues", run_12bar_blues, data)
+    return jsonify(run_12bar_blues(data))
 
 def get_4th_note(root_note):
     """Get the 4th note (perfect 4th) from the root note"""
-    notes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    root_index = notes.index(root_note)
-    fourth_index = (root_index + 5) % 12  # Perfect 4th is 5 semitones up
-    return notes[fourth_index]
+    return get_note_at_interval(root_note, 5)  # Perfect 4th is 5 semitones up
 
 def get_5th_note(root_note):
     """Get the 5th note (perfect 5th) from the root note"""
-    notes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    root_index = notes.index(root_note)
-    fifth_index = (root_index + 7) % 12  # Perfect 5th is 7 semitones up
-    return notes[fifth_index]
+    return get_note_at_interval(root_note, 7)  # Perfect 5th is 7 semitones up
+
+# Bracketed remarks like "(Remastered 2011)" or "[Live]", and "feat." credits up to a dash or the end
+TITLE_REMARK_RE = re.compile(r"\s*[(\[][^)\]]*[)\]]|\s+(?:feat|ft)\.?\s.*?(?=\s+[-–—|]\s+|$)", re.IGNORECASE)
+# The spaced dash of "Artist - Title" or "Title - Artist"
+TITLE_DASH_RE = re.compile(r"\s+[-–—|]\s+")
+TITLE_PUNCTUATION_RE = re.compile(r"[^\w\s]+|_")
+
+def _fold_title(text):
+    """Fold case, accents, "&", apostrophes and punctuation out of a piece of a title"""
+    text = unicodedata.normalize("NFKD", text.replace("&", " and "))
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    return " ".join(TITLE_PUNCTUATION_RE.sub(" ", text.replace("'", "").replace("’", "")).split())
+
+def normalize_title(title):
+    """Fold a song title to the form it is cached under
+
+    Bracketed remarks and "feat." credits are dropped, then case, accents, "&"
+    and punctuation are folded: "hotel california " and "Hotel California
+    (Live)" become "hotel california". Which side of a dash is the artist
+    can't be told, so both sides are kept in a fixed order: "Eagles - Hotel
+    California" and "Hotel California - Eagles" both become
+    "eagles - hotel california".
+    """
+    title = TITLE_REMARK_RE.sub("", title.strip()) or title
+    parts = sorted(part for part in map(_fold_title, TITLE_DASH_RE.split(title)) if part)
+    return " - ".join(parts)
+
+def title_lookup_keys(key):
+    """Keys a normalized title's answer may be cached under, most specific first
+
+    A title with an artist also finds the answer stored for either side of the
+    dash alone, so "Hotel California - Eagles" reuses "Hotel California". That
+    side may be a different song ("Yesterday - Leona Lewis"), so only the
+    first key is an exact hit.
+    """
+    parts = key.split(" - ")
+    return [key] + (parts if len(parts) > 1 else [])
+
+# (title, a key its cached answer is found under)
+TITLE_CONFORMANCE = [
+    ("Hotel California", "hotel california"),
+    ("hotel california ", "hotel california"),
+    ("Hotel California (Live)", "hotel california"),
+    ("Hotel California - Eagles", "eagles - hotel california"),
+    ("Hotel California - Eagles", "hotel california"),
+    ("Eagles - Hotel California", "eagles - hotel california"),
+    ("AC/DC - Back in Black", "ac dc - back in black"),
+    ("AC/DC - Highway to Hell", "ac dc - highway to hell"),
+    ("Don't Stop Believin' (Remastered 2011)", "dont stop believin"),
+    ("Beyoncé & Jay-Z - Crazy in Love", "beyonce and jay z - crazy in love"),
+    ("Empire State of Mind feat. Alicia Keys - Jay-Z", "empire state of mind - jay z"),
+    ("Stand By Me", "stand by me"),
+    ("Yesterday [Live]", "yesterday"),
+]
+
+def check_title_conformance():
+    """Run TITLE_CONFORMANCE through the title normalizer and return a description of every mismatch"""
+    failures = []
+    for title, key in TITLE_CONFORMANCE:
+        got = normalize_title(title)
+        if key not in title_lookup_keys(got):
+            failures.append(f"{title!r}: expected {key!r} among {title_lookup_keys(got)!r}")
+    for title, cached, expected in TITLE_TYPO_CONFORMANCE:
+        if is_title_typo(normalize_title(title), normalize_title(cached)) != expected:
+            failures.append(f"{title!r} {'should' if expected else 'should not'} reuse the answer for {cached!r}")
+    return failures
+
+def title_trigrams(title):
+    """Character trigrams of a normalized title, padded so word starts count"""
+    padded = f"  {title} "
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+def _edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return previous[-1]
+
+def is_title_typo(key, candidate):
+    """Whether two normalized titles differ only by a typo
+
+    They need the same number of words and at most one edit per 8
+    characters, so "Summertime Blues" never matches "Summertime".
+    """
+    return (len(key.split()) == len(candidate.split())
+            and _edit_distance(key, candidate) <= max(1, len(key) // 8))
+
+# (title, cached title, whether the first may reuse the second's answer)
+TITLE_TYPO_CONFORMANCE = [
+    ("Hotel Californa", "Hotel California", True),
+    ("Hotel Califronia", "Hotel California", True),
+    ("Bohemian Rapsody", "Bohemian Rhapsody", True),
+    ("Summertime Blues", "Summertime", False),
+    ("Help", "Hello", False),
+    ("Eagles - Take It Easy", "Eagles - Hotel California", False),
+    ("AC/DC - Back in Black", "AC/DC - Highway to Hell", False),
+]
+
+def lookup_title_answer(kind, key, prompt_version, model):
+    """Cached answer for a normalized title, either side of its dash, or the most similar title, as (data, stale, cache)"""
+    try:
+        for candidate in title_lookup_keys(key):
+            data, stale = llm_cache.get(kind, candidate, prompt_version, model, SONG_CACHE_TTL)
+            if data is not None:
+                if candidate != key:
+                    # One side of the dash alone is a guess, re-asked like a typo match
+                    return data, stale, "fuzzy"
+                return data, stale, "stale" if stale else "hit"
+        similar = llm_cache.find_similar(kind, key, prompt_version, model, SONG_FUZZY_MATCH,
+                                         accept=lambda candidate: is_title_typo(key, candidate))
+        if similar is not None:
+            data, stale = llm_cache.get(kind, similar, prompt_version, model, SONG_CACHE_TTL)
+            return data, stale, "fuzzy"
+    except sqlite3.Error as e:
+        print(f"⚠️ LLM cache read failed: {e}")
+    return None, False, "miss"
+
+def store_title_answer(kind, key, prompt_version, model, data):
+    """Store an answer under a normalized title and index it for fuzzy lookups"""
+    try:
+        llm_cache.put(kind, key, prompt_version, model, data, index=True)
+    except sqlite3.Error as e:
+        print(f"⚠️ LLM cache write failed: {e}")
+
+async def cached_title_answer(kind, song_title, prompt_version, model, ask):
+    """A model answer about a song, from the LLM cache when the same or a similar title was asked before
+
+    Runs on the LLM loop, with the SQLite work handed to the loop's default
+    executor so a slow lookup never holds up other model calls. ask() returns
+    a coroutine that calls the model and returns a result dict; only
+    successful answers that are not fallbacks are stored. Stale answers are
+    served and refreshed in the background. A fuzzy match is served too, but
+    the model is still asked about the requested title in the background,
+    since a near spelling can be a different song ("Yesterdays"). The
+    result carries "cache": "hit", "stale", "fuzzy" or "miss".
+    """
+    loop = asyncio.get_running_loop()
+    key = normalize_title(song_title)
+    data, stale, cache = await loop.run_in_executor(None, lookup_title_answer, kind, key, prompt_version, model)
+    
+    def cacheable(result):
+        return result["data"] if result.get("success") and not result.get("fallback") else None
+    
+    if data is not None:
+        if stale or cache == "fuzzy":
+            # Asked about the requested title, so the answer belongs under its key even after a fuzzy match
+            llm_cache.refresh(kind, key, prompt_version, model, lambda: cacheable(call_llm(ask())), index=True)
+        return {"success": True, "data": data, "cache": cache}
+    
+    result = await ask()
+    if cacheable(result) is not None:
+        await loop.run_in_executor(None, store_title_answer, kind, key, prompt_version, model, result["data"])
+    return dict(result, cache="miss")
+
+def get_song_analysis(song_title):
+    """analyze_song_with_openai() through the LLM cache"""
+    return call_llm(get_song_analysis_async(song_title))
+
+async def get_song_analysis_async(song_title):
+    """get_song_analysis() as a coroutine for the LLM loop"""
+    return await cached_title_answer("song", song_title, SONG_PROMPT_VERSION, SONG_MODEL,
+                                     lambda: analyze_song_with_openai_async(song_title))
+
+def get_chord_sheet(song_title):
+    """generate_chord_table_with_openai() through the LLM cache"""
+    return call_llm(get_chord_sheet_async(song_title))
+
+async def get_chord_sheet_async(song_title):
+    """get_chord_sheet() as a coroutine for the LLM loop"""
+    return await cached_title_answer("chord_sheet", song_title, SHEET_PROMPT_VERSION, SHEET_MODEL,
+                                     lambda: generate_chord_table_with_openai_async(song_title))
 
 def analyze_song_with_openai(song_title):
     """Use OpenAI GPT-4o-mini to analyze a song and extract chord progression"""
+    return call_llm(analyze_song_with_openai_async(song_title))
+
+async def analyze_song_with_openai_async(song_title):
+    """analyze_song_with_openai() as a coroutine for the LLM loop"""
     try:
         prompt = f"""
         Analyze the song "{song_title}" and provide the chord progression in the following JSON format:
@@ -398,9 +2169,10 @@ def analyze_song_with_openai(song_title):
         Return only valid JSON, no additional text.
         """
         
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        client = get_async_openai()
+        response = await client.chat.completions.create(
+            model=SONG_MODEL,
+            timeout=SONG_TIMEOUT,
             messages=[
                 {"role": "system", "content": "You are a music theory expert. Analyze songs and provide chord progressions in JSON format."},
                 {"role": "user", "content": prompt}
@@ -431,6 +2203,7 @@ def analyze_song_with_openai(song_title):
             # Fallback: create a simple progression based on common patterns
             return {
                 "success": True,
+                "fallback": True,
                 "data": {
                     "key": "C",
                     "progression": [
@@ -448,55 +2221,482 @@ def analyze_song_with_openai(song_title):
         print(f"OpenAI API error: {e}")
         return {"success": False, "error": str(e)}
 
-def parse_chord_string(chord_string):
-    """Parse a chord string like 'C major' or 'Fm' into root note and chord type"""
-    chord_string = chord_string.strip().lower()
-    
-    # Common chord abbreviations
-    chord_mappings = {
-        "major": "major",
-        "maj": "major", 
-        "m": "minor",
-        "minor": "minor",
-        "min": "minor",
-        "dim": "diminished",
-        "diminished": "diminished",
-        "aug": "augmented",
-        "augmented": "augmented",
-        "7": "dominant7",
-        "dom7": "dominant7",
-        "dominant7": "dominant7",
-        "maj7": "major7",
-        "major7": "major7",
-        "min7": "minor7",
-        "minor7": "minor7",
-        "dim7": "diminished7",
-        "diminished7": "diminished7",
-        "5": "power",
-        "power": "power"
-    }
-    
-    # Extract root note (first character, handle sharps/flats)
-    root_note = chord_string[0].upper()
-    if len(chord_string) > 1 and chord_string[1] in ['#', 'b']:
-        if chord_string[1] == 'b':
-            # Convert flat to sharp equivalent
-            flat_to_sharp = {"Bb": "A#", "Eb": "D#", "Ab": "G#", "Db": "C#", "Gb": "F#"}
-            root_note = flat_to_sharp.get(root_note + "b", root_note + "b")
-        else:
-            root_note += chord_string[1]
-    
-    # Extract chord type from the rest
-    chord_type = "major"  # default
-    for key, value in chord_mappings.items():
-        if key in chord_string:
-            chord_type = value
-            break
-    
-    return root_note, chord_type
+# One grammar for every chord symbol we accept: root, accidental, quality,
+# extension, alterations/additions/sus, and an optional slash bass. Single
+# letters are case-sensitive (m is minor, M is major), words are not.
+# Symbols are matched with whitespace collapsed to single spaces, and every
+# optional space belongs to exactly one token, so no input can make the
+# matcher try the same space in several places.
+CHORD_SYMBOL_PATTERN = r"""
+    ^(?P<root>[A-Ga-g])(?P<accidental>[#♯b♭]?)
+    (?:\ ?(?P<quality>(?i:half[-\ ]?diminished|diminished|dim|augmented|aug|dominant|dom|major|maj|ma|minor|min|mi|power)
+        |[øØ°o+Δ^Mm-]))?
+    (?P<extension>\ ?(?:\(\ ?)?(?:(?P<major_seventh>(?i:maj|ma)|M|Δ|\^)\ ?)?(?P<degree>6/9|69|13|11|9|7|6|5)(?:\ ?\))?)?
+    (?P<alterations>(?:\ ?(?:[(,]\ ?)?(?:[b#♭♯+-](?:5|6|9|11|13)|(?i:add)\ ?(?:2|4|9|11|13)|(?i:no)\ ?[35]|(?i:sus)[24]?)(?:\ ?\))?)*)
+    (?:\ ?/\ ?(?P<bass>[A-Ga-g][#♯b♭]?))?
+"""
+CHORD_SYMBOL_RE = re.compile(CHORD_SYMBOL_PATTERN + r"$", re.VERBOSE)
+# The longest leading part of a string the grammar accepts, for symbols with trailing text like "Bb7alt"
+CHORD_PREFIX_RE = re.compile(CHORD_SYMBOL_PATTERN, re.VERBOSE)
+CHORD_ALTERATION_RE = re.compile(r"([b#♭♯+-])(5|6|9|11|13)|(?i:add)\s*(2|4|9|11|13)|(?i:no)\s*([35])|(?i:sus)([24]?)")
+
+LETTER_PITCH_CLASSES = {letter: NOTE_INDEX[letter] for letter in "CDEFGAB"}
+ACCIDENTAL_OFFSETS = {"": 0, "#": 1, "♯": 1, "b": -1, "♭": -1}
+CHORD_QUALITY_TOKENS = {
+    "": "major", "M": "major", "ma": "major", "maj": "major", "major": "major", "Δ": "major", "^": "major",
+    "m": "minor", "-": "minor", "mi": "minor", "min": "minor", "minor": "minor",
+    "o": "diminished", "°": "diminished", "dim": "diminished", "diminished": "diminished",
+    "ø": "half-diminished", "Ø": "half-diminished", "halfdiminished": "half-diminished",
+    "+": "augmented", "aug": "augmented", "augmented": "augmented",
+    "dom": "dominant", "dominant": "dominant", "power": "power",
+}
+TRIAD_INTERVALS = {
+    "major": (0, 4, 7), "dominant": (0, 4, 7), "minor": (0, 3, 7), "diminished": (0, 3, 6),
+    "half-diminished": (0, 3, 6), "augmented": (0, 4, 8), "power": (0, 7),
+}
+DEGREE_INTERVALS = {2: 2, 4: 5, 5: 7, 6: 9, 9: 14, 11: 17, 13: 21}
+
+class ParsedChord(NamedTuple):
+    """A chord symbol broken into its parts; `root` and `bass` use sharp names"""
+    symbol: str
+    root: str
+    root_spelling: str
+    quality: str
+    extension: str
+    alterations: Tuple[str, ...]
+    bass: Optional[str]
+    intervals: Tuple[int, ...]
+    chord_type: str
+
+    def pitch_class_set(self):
+        """PitchClassSet of every sounding note, slash bass included, rooted on the chord's root"""
+        if self.intervals == CHORD_PATTERNS.get(self.chord_type):
+            chord = CHORD_MASKS[self.chord_type].transpose(NOTE_INDEX[self.root])
+        else:
+            chord = PitchClassSet.from_intervals(NOTE_INDEX[self.root], self.intervals)
+        if self.bass is None:
+            return chord
+        return chord.union(PitchClassSet.from_intervals(NOTE_INDEX[self.bass], (0,)))
+
+def collapse_whitespace(text):
+    """Text with leading and trailing whitespace dropped and every inner run turned into one space"""
+    return " ".join(text.split())
+
+def _pitch_class(letter, accidental):
+    return (LETTER_PITCH_CLASSES[letter.upper()] + ACCIDENTAL_OFFSETS[accidental]) % 12
+
+@functools.lru_cache(maxsize=CHORD_PARSE_CACHE_SIZE)
+def parse_chord_symbol(symbol):
+    """Parse a chord symbol like "Bbm7b5/E" or "G major" into a ParsedChord
+
+    Raises ValueError for anything the chord grammar does not accept.
+    """
+    match = CHORD_SYMBOL_RE.match(collapse_whitespace(symbol))
+    if match is None:
+        raise ValueError(f"Not a chord symbol: {symbol!r}")
+    
+    token = match["quality"] or ""
+    # Single letters keep their case (m is minor, M is major), words are folded like "Half-Diminished"
+    token = token if len(token) == 1 else re.sub(r"[-\s]", "", token.lower())
+    quality = CHORD_QUALITY_TOKENS[token]
+    degree = match["degree"] or ""
+    if not degree and (token in ("Δ", "^") or quality in ("dominant", "half-diminished")):
+        degree = "7"
+    # "Cmaj7" and "CM9" make the quality's M a major seventh, "CmM7" spells it after the quality
+    major_seventh = bool(match["major_seventh"]) or (token in ("M", "ma", "maj", "major", "Δ", "^") and
+                                                    degree in ("7", "9", "11", "13"))
+    
+    intervals = set(TRIAD_INTERVALS[quality])
+    if degree == "5":
+        quality = "power"
+        intervals = {0, 7}
+    elif degree == "6":
+        intervals.add(9)
+    elif degree in ("6/9", "69"):
+        intervals.update((9, 14))
+    elif degree:
+        intervals.add(11 if major_seventh else 9 if quality == "diminished" else 10)
+        intervals.update({"9": (14,), "11": (14, 17), "13": (14, 21)}.get(degree, ()))
+    
+    alterations = []
+    for accidental, altered, added, omitted, sus in CHORD_ALTERATION_RE.findall(match["alterations"]):
+        if altered:
+            natural = DEGREE_INTERVALS[int(altered)]
+            sign = -1 if accidental in "b♭-" else 1
+            intervals.discard(natural)
+            intervals.add(natural + sign)
+            alterations.append(("b" if sign < 0 else "#") + altered)
+        elif added:
+            intervals.add(DEGREE_INTERVALS[int(added)])
+            alterations.append("add" + added)
+        elif omitted:
+            intervals.difference_update((3, 4) if omitted == "3" else (6, 7, 8))
+            alterations.append("no" + omitted)
+        else:
+            intervals.difference_update((3, 4))
+            intervals.add(DEGREE_INTERVALS[int(sus or 4)])
+            quality = "suspended"
+            alterations.append("sus" + (sus or "4"))
+    
+    if quality == "power":
+        chord_type = "power"
+    elif quality == "diminished":
+        chord_type = "diminished7" if 9 in intervals else "diminished"
+    elif quality == "half-diminished":
+        chord_type = "minor7"
+    elif quality == "augmented":
+        chord_type = "augmented"
+    elif quality == "minor":
+        chord_type = "minor7" if 10 in intervals else "minor"
+    else:
+        chord_type = "major7" if 11 in intervals else "dominant7" if 10 in intervals else "major"
+    
+    bass = match["bass"]
+    return ParsedChord(
+        symbol=symbol,
+        root=NOTE_NAMES[_pitch_class(match["root"], match["accidental"])],
+        root_spelling=match["root"].upper() + match["accidental"].replace("♯", "#").replace("♭", "b"),
+        quality=quality,
+        extension=("maj" if major_seventh else "") + degree,
+        alterations=tuple(alterations),
+        bass=NOTE_NAMES[_pitch_class(bass[0], bass[1:])] if bass else None,
+        intervals=tuple(sorted(intervals)),
+        chord_type=chord_type,
+    )
+
+def parse_playable_chord(chord_string):
+    """ParsedChord to play for a chord string, C major when nothing of it parses"""
+    chord_string = collapse_whitespace(chord_string)
+    try:
+        return parse_chord_symbol(chord_string)
+    except ValueError:
+        # Play the part the grammar understands, so "Bb7alt" still sounds as Bb7
+        prefix = CHORD_PREFIX_RE.match(chord_string)
+        if prefix is None:
+            return parse_chord_symbol("C")
+        end = prefix.end()
+        if end < len(chord_string) and chord_string[end - 1].isalpha() and chord_string[end].isalpha():
+            # A prefix ending inside a word read only part of it ("Cmx" is not Cm), so keep just the root
+            return parse_chord_symbol(prefix["root"] + prefix["accidental"])
+        return parse_chord_symbol(prefix.group().strip())
+
+def parse_chord_string(chord_string):
+    """Parse a chord string like 'C major' or 'Fm' into root note and chord type"""
+    chord = parse_playable_chord(chord_string)
+    return chord.root, chord.chord_type
+
+def parsed_chord_notes(chord):
+    """MIDI notes of a ParsedChord's intervals in root position above C4 = 60, without its bass"""
+    root = 60 + NOTE_INDEX[chord.root]
+    return [root + interval for interval in chord.intervals]
+
+def add_bass_note(chord_notes, bass):
+    """Chord notes with a slash bass (a note name) below them, unless the lowest note already is that pitch class"""
+    lowest = min(chord_notes)
+    if bass is None or lowest % 12 == NOTE_INDEX[bass]:
+        return chord_notes
+    return [lowest - ((lowest - NOTE_INDEX[bass]) % 12 or 12)] + chord_notes
+
+# (symbol, root, chord_type, intervals, bass); an empty root means the parser must reject the symbol
+CHORD_CONFORMANCE = [
+    ("C", "C", "major", (0, 4, 7), None),
+    ("C major", "C", "major", (0, 4, 7), None),
+    ("c major", "C", "major", (0, 4, 7), None),
+    ("CM", "C", "major", (0, 4, 7), None),
+    ("Cm", "C", "minor", (0, 3, 7), None),
+    ("C-", "C", "minor", (0, 3, 7), None),
+    ("C minor", "C", "minor", (0, 3, 7), None),
+    ("Cmin", "C", "minor", (0, 3, 7), None),
+    ("F#m", "F#", "minor", (0, 3, 7), None),
+    ("Bb", "A#", "major", (0, 4, 7), None),
+    ("Eb minor", "D#", "minor", (0, 3, 7), None),
+    ("Cb", "B", "major", (0, 4, 7), None),
+    ("E#m", "F", "minor", (0, 3, 7), None),
+    ("B♭7", "A#", "dominant7", (0, 4, 7, 10), None),
+    ("Cdim", "C", "diminished", (0, 3, 6), None),
+    ("C°", "C", "diminished", (0, 3, 6), None),
+    ("Cdim7", "C", "diminished7", (0, 3, 6, 9), None),
+    ("Co7", "C", "diminished7", (0, 3, 6, 9), None),
+    ("Cø", "C", "minor7", (0, 3, 6, 10), None),
+    ("Cø7", "C", "minor7", (0, 3, 6, 10), None),
+    ("Cm7b5", "C", "minor7", (0, 3, 6, 10), None),
+    ("Caug", "C", "augmented", (0, 4, 8), None),
+    ("C+", "C", "augmented", (0, 4, 8), None),
+    ("C7#5", "C", "dominant7", (0, 4, 8, 10), None),
+    ("C7", "C", "dominant7", (0, 4, 7, 10), None),
+    ("C dominant7", "C", "dominant7", (0, 4, 7, 10), None),
+    ("Cdom7", "C", "dominant7", (0, 4, 7, 10), None),
+    ("Cmaj7", "C", "major7", (0, 4, 7, 11), None),
+    ("CM7", "C", "major7", (0, 4, 7, 11), None),
+    ("CΔ", "C", "major7", (0, 4, 7, 11), None),
+    ("CΔ7", "C", "major7", (0, 4, 7, 11), None),
+    ("C major7", "C", "major7", (0, 4, 7, 11), None),
+    ("C maj7", "C", "major7", (0, 4, 7, 11), None),
+    ("F#mi7", "F#", "minor7", (0, 3, 7, 10), None),
+    ("Bbmi7", "A#", "minor7", (0, 3, 7, 10), None),
+    ("CMI", "C", "minor", (0, 3, 7), None),
+    ("Ebm(b6)", "D#", "minor", (0, 3, 7, 8), None),
+    ("CMaj7", "C", "major7", (0, 4, 7, 11), None),
+    ("CMAJ7", "C", "major7", (0, 4, 7, 11), None),
+    ("Cma7", "C", "major7", (0, 4, 7, 11), None),
+    ("CMA7", "C", "major7", (0, 4, 7, 11), None),
+    ("Cma", "C", "major", (0, 4, 7), None),
+    ("C Major 7", "C", "major7", (0, 4, 7, 11), None),
+    ("C Major7", "C", "major7", (0, 4, 7, 11), None),
+    ("Cmaj9", "C", "major7", (0, 4, 7, 11, 14), None),
+    ("Cm7", "C", "minor7", (0, 3, 7, 10), None),
+    ("Cmin7", "C", "minor7", (0, 3, 7, 10), None),
+    ("C-7", "C", "minor7", (0, 3, 7, 10), None),
+    ("C minor7", "C", "minor7", (0, 3, 7, 10), None),
+    ("CmM7", "C", "minor", (0, 3, 7, 11), None),
+    ("Cm(maj7)", "C", "minor", (0, 3, 7, 11), None),
+    ("C5", "C", "power", (0, 7), None),
+    ("C power", "C", "power", (0, 7), None),
+    ("C6", "C", "major", (0, 4, 7, 9), None),
+    ("Cm6", "C", "minor", (0, 3, 7, 9), None),
+    ("C6/9", "C", "major", (0, 4, 7, 9, 14), None),
+    ("C69", "C", "major", (0, 4, 7, 9, 14), None),
+    ("C9", "C", "dominant7", (0, 4, 7, 10, 14), None),
+    ("Cm9", "C", "minor7", (0, 3, 7, 10, 14), None),
+    ("C11", "C", "dominant7", (0, 4, 7, 10, 14, 17), None),
+    ("C13", "C", "dominant7", (0, 4, 7, 10, 14, 21), None),
+    ("C7b9", "C", "dominant7", (0, 4, 7, 10, 13), None),
+    ("C7#9", "C", "dominant7", (0, 4, 7, 10, 15), None),
+    ("C7(b9,#11)", "C", "dominant7", (0, 4, 7, 10, 13, 18), None),
+    ("C13b9", "C", "dominant7", (0, 4, 7, 10, 13, 21), None),
+    ("Cadd9", "C", "major", (0, 4, 7, 14), None),
+    ("Cmadd9", "C", "minor", (0, 3, 7, 14), None),
+    ("C(add2)", "C", "major", (0, 2, 4, 7), None),
+    ("Csus", "C", "major", (0, 5, 7), None),
+    ("Csus2", "C", "major", (0, 2, 7), None),
+    ("Csus4", "C", "major", (0, 5, 7), None),
+    ("C7sus4", "C", "dominant7", (0, 5, 7, 10), None),
+    ("C7no3", "C", "dominant7", (0, 7, 10), None),
+    ("C/E", "C", "major", (0, 4, 7), "E"),
+    ("Am7/G", "A", "minor7", (0, 3, 7, 10), "G"),
+    ("D/F#", "D", "major", (0, 4, 7), "F#"),
+    ("Bb/Ab", "A#", "major", (0, 4, 7), "G#"),
+    ("C6/A", "C", "major", (0, 4, 7, 9), "A"),
+    ("  G7  ", "G", "dominant7", (0, 4, 7, 10), None),
+    ("C  7 ( b9 ,  #11 )  /  E", "C", "dominant7", (0, 4, 7, 10, 13, 18), "E"),
+    ("C" + " " * 10000 + "x", "", "", (), None),
+    ("C7" + " b9" * 1000 + " x", "", "", (), None),
+    ("", "", "", (), None),
+    ("H7", "", "", (), None),
+    ("N.C.", "", "", (), None),
+    ("C7alt", "", "", (), None),
+    ("Cmajor minor", "", "", (), None),
+]
+
+def check_chord_conformance():
+    """Run CHORD_CONFORMANCE through the parser and return a description of every mismatch"""
+    failures = []
+    for symbol, root, chord_type, intervals, bass in CHORD_CONFORMANCE:
+        try:
+            chord = parse_chord_symbol(symbol)
+        except ValueError:
+            if root:
+                failures.append(f"{symbol!r}: rejected")
+            continue
+        got = (chord.root, chord.chord_type, chord.intervals, chord.bass)
+        if got != (root, chord_type, intervals, bass):
+            failures.append(f"{symbol!r}: expected {(root, chord_type, intervals, bass)}, got {got}")
+    return failures
+
+# Interval each instrument's part is written above concert pitch
+TRANSPOSING_INSTRUMENTS = {"Concert": 0, "Bb": 2, "Eb": 9, "F": 7}
+MAJOR_KEY_NAMES = ["C", "Db", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+MINOR_KEY_NAMES = ["C", "C#", "D", "Eb", "E", "F", "F#", "G", "G#", "A", "Bb", "B"]
+_LETTERS = "CDEFGAB"
+FLAT_NOTE_NAMES = {0: "C", 1: "Db", 2: "D", 3: "Eb", 4: "E", 5: "F", 6: "Gb", 7: "G", 8: "Ab", 9: "A", 10: "Bb", 11: "B"}
+_ACCIDENTAL_NAMES = {0: "", 1: "#", 2: "##", 10: "bb", 11: "b"}
+# A chord in a bar starts with a capital root after a space, bar line, comma or bracket
+CHORD_TOKEN_RE = re.compile(r"(?<![^\s|,(\[])[A-G][^\s|,\[\]]*")
+
+def key_spelling(tonic, mode="major"):
+    """Names of all 12 pitch classes as spelled in a key, e.g. key_spelling("Eb")[1] == "Db"
+
+    Scale degrees (and the leading tone in minor) take consecutive letters from
+    the tonic; the remaining pitch classes use flats in flat keys and sharps in
+    sharp keys.
+    """
+    tonic_pc = NOTE_INDEX[tonic]
+    degrees = (0, 2, 4, 5, 7, 9, 11) if mode == "major" else (0, 2, 3, 5, 7, 8, 10)
+    letter = _LETTERS.index(tonic[0])
+    names = [None] * 12
+    for step, degree in enumerate(degrees):
+        step_letter = _LETTERS[(letter + step) % 7]
+        pitch_class = (tonic_pc + degree) % 12
+        names[pitch_class] = step_letter + _ACCIDENTAL_NAMES[(pitch_class - NOTE_INDEX[step_letter]) % 12]
+    if mode == "minor":
+        seventh = _LETTERS[(letter + 6) % 7]
+        leading_tone = (tonic_pc + 11) % 12
+        names[leading_tone] = seventh + _ACCIDENTAL_NAMES[(leading_tone - NOTE_INDEX[seventh]) % 12]
+    flat_key = any("b" in name for name in names if name) or (tonic, mode) in (("C", "major"), ("A", "minor"))
+    for pitch_class in range(12):
+        if names[pitch_class] is None:
+            names[pitch_class] = (FLAT_NOTE_NAMES if flat_key and pitch_class != 6 else NOTE_NAMES)[pitch_class]
+    return names
+
+_LETTER_NAMES = np.array(list(_LETTERS), dtype=object)
+_LETTER_PCS = np.array([NOTE_INDEX[letter] for letter in _LETTERS])
+_ACCIDENTAL_ARRAY = np.array([_ACCIDENTAL_NAMES.get(offset, "") for offset in range(12)], dtype=object)
+# Spelling of every pitch class in every key: [mode][tonic pitch class][pitch class], major then minor
+KEY_SPELLINGS = np.array([[key_spelling(name, mode) for name in names]
+                          for mode, names in (("major", MAJOR_KEY_NAMES), ("minor", MINOR_KEY_NAMES))], dtype=object)
+
+def parse_key(key):
+    """(tonic, mode) of a key name like "Bb major", "F# minor" or "Am"; C major if it can't be read"""
+    try:
+        chord = parse_chord_symbol(key.strip())
+    except (ValueError, AttributeError):
+        return "C", "major"
+    return chord.root_spelling, "minor" if chord.quality == "minor" else "major"
+
+def transposition_interval(target):
+    """Semitones for an instrument name ("Bb", "Eb", "F", "Concert") or an interval like 5 or "-3" """
+    if target in TRANSPOSING_INSTRUMENTS:
+        return TRANSPOSING_INSTRUMENTS[target]
+    if isinstance(target, int) or re.fullmatch(r"[+-]?\d+", str(target).strip()):
+        return int(target)
+    raise ValueError(f"Unknown transposition target: {target!r}")
+
+def _chord_sheet_template(bars):
+    """Split bars into literal text and chord root/bass slots, returning (templates, spelled roots)"""
+    templates = []
+    roots = []
+    for bar in bars:
+        pieces = []
+        last = 0
+        for token in CHORD_TOKEN_RE.finditer(bar):
+            text = token.group()
+            # "(A7)" is a chord in parentheses, "C7(b9)" keeps its own
+            while text.endswith(")") and text.count(")") > text.count("("):
+                text = text[:-1]
+            try:
+                chord = parse_chord_symbol(text)
+            except ValueError:
+                continue
+            pieces += [bar[last:token.start()], len(roots)]
+            roots.append(chord.root_spelling)
+            last = token.start() + len(chord.root_spelling)
+            if chord.bass:
+                bass_start = token.start() + text.rindex("/") + 1
+                bass_end = token.start() + len(text)
+                pieces += [bar[last:bass_start], len(roots)]
+                roots.append(bar[bass_start].upper() + bar[bass_start + 1:bass_end].replace("♯", "#").replace("♭", "b"))
+                last = bass_end
+        pieces.append(bar[last:])
+        templates.append(pieces)
+    return templates, roots
+
+def transpose_chord_sheet(chords, key="C major", targets=("Concert", "Bb", "Eb")):
+    """Transpose every bar of a chord sheet for several instruments or intervals at once
+
+    `chords` maps section names to lists of bar strings, as in ChordSheet.
+    All chord roots and slash basses of the sheet are shifted for every target
+    in one array operation. Letters move by the same step as the key's tonic,
+    so Eb in C major becomes F in D major, not E#. Returns
+    {target: {"key", "interval", "chords": {section: bars}, "bars": [...]}}.
+    """
+    tonic, mode = parse_key(key)
+    intervals = np.array([transposition_interval(target) for target in targets], dtype=int)
+    sections = list(chords.items())
+    templates, roots = _chord_sheet_template([bar for _, bars in sections for bar in bars])
+    
+    mode_index = 0 if mode == "major" else 1
+    key_names = MAJOR_KEY_NAMES if mode == "major" else MINOR_KEY_NAMES
+    written_tonics = (NOTE_INDEX[tonic] + intervals) % 12
+    letter_shifts = np.array([_LETTERS.index(key_names[pc][0]) for pc in written_tonics]) - _LETTERS.index(tonic[0])
+    root_pcs = np.array([NOTE_INDEX.get(root, NOTE_INDEX[root[0]]) for root in roots], dtype=int)
+    root_letters = np.array([_LETTERS.index(root[0]) for root in roots], dtype=int)
+    
+    # (targets, roots) pitch classes, spelled by moving every letter as far as the key's tonic moved
+    written_pcs = (root_pcs[None, :] + intervals[:, None]) % 12
+    letters = (root_letters[None, :] + letter_shifts[:, None]) % 7
+    accidentals = (written_pcs - _LETTER_PCS[letters]) % 12
+    names = _LETTER_NAMES[letters] + _ACCIDENTAL_ARRAY[accidentals]
+    # Double accidentals and a B#, E#, Cb or Fb the key doesn't contain read badly in a lead sheet,
+    # so those take the key's own spelling
+    key_names_per_root = KEY_SPELLINGS[mode_index][written_tonics[:, None], written_pcs]
+    awkward = (accidentals == 2) | (accidentals == 10) | (
+        np.isin(names, ("B#", "E#", "Cb", "Fb")) & (names != key_names_per_root))
+    names = np.where(awkward, key_names_per_root, names)
+    
+    result = {}
+    for row, target in enumerate(targets):
+        if intervals[row] % 12 == 0:
+            # Same key: keep the sheet's own spelling
+            spelled, written_key = roots, tonic
+        else:
+            spelled, written_key = names[row], key_names[written_tonics[row]]
+        bars = ["".join(piece if isinstance(piece, str) else spelled[piece] for piece in pieces)
+                for pieces in templates]
+        section_bars = {}
+        position = 0
+        for section, original in sections:
+            section_bars[section] = bars[position:position + len(original)]
+            position += len(original)
+        result[str(target)] = {"key": f"{written_key} {mode}", "interval": int(intervals[row]),
+                               "chords": section_bars, "bars": bars}
+    return result
+
+# Krumhansl-Kessler probe-tone profiles, tonic first
+MAJOR_KEY_PROFILE = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+MINOR_KEY_PROFILE = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+
+def _standardize(rows):
+    """Scale rows to zero mean and unit norm, so their dot product is the Pearson correlation"""
+    rows = rows - rows.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+    return np.divide(rows, norms, out=np.zeros_like(rows), where=norms > 0)
+
+# All 24 keys as rows: 12 major keys on C..B, then 12 minor keys
+KEY_PROFILES = _standardize(np.array([np.roll(profile, tonic) for profile in (MAJOR_KEY_PROFILE, MINOR_KEY_PROFILE)
+                                      for tonic in range(12)]))
+KEY_PROFILE_NAMES = [f"{name} major" for name in MAJOR_KEY_NAMES] + [f"{name} minor" for name in MINOR_KEY_NAMES]
+
+def pitch_class_histograms(progressions):
+    """(N, 12) duration-weighted pitch-class histograms of a batch of progressions' steps
+
+    Each step counts every pitch class it sounds once, however many octaves double it.
+    """
+    steps = [step for progression in progressions for step in progression]
+    steps_per_progression = np.array([len(progression) for progression in progressions], dtype=np.intp)
+    masks = np.fromiter((PitchClassSet.from_midi(step["notes"]).mask for step in steps), dtype=np.intp, count=len(steps))
+    weights = np.array([step["beats"] for step in steps], dtype=float)
+    rows = np.repeat(np.arange(len(progressions)), steps_per_progression)
+    histograms = np.zeros((len(progressions), 12))
+    np.add.at(histograms, rows, MASK_MEMBERSHIP[masks] * weights[:, None])
+    return histograms
+
+def key_correlations(histograms):
+    """Correlation of every histogram with every key profile: one (N, 12) @ (12, 24) product"""
+    return _standardize(np.asarray(histograms, dtype=float)) @ KEY_PROFILES.T
+
+def detect_keys(progressions, top=3):
+    """Most likely keys of a batch of progressions, each a list of {"key", "tonic", "mode", "confidence"}
+
+    Confidence is the correlation between the progression's duration-weighted
+    pitch-class histogram and the key's profile, best first.
+    """
+    correlations = key_correlations(pitch_class_histograms(progressions))
+    ranked = np.argsort(-correlations, axis=1, kind="stable")[:, :top]
+    scores = np.take_along_axis(correlations, ranked, axis=1).round(3)
+    return [[{"key": KEY_PROFILE_NAMES[index], "tonic": KEY_PROFILE_NAMES[index].split()[0],
+              "mode": "major" if index < 12 else "minor", "confidence": score}
+             for index, score in zip(order, row)] for order, row in zip(ranked.tolist(), scores.tolist())]
+
+def detect_key(steps, top=3):
+    """Most likely keys of one progression's steps, best first"""
+    return detect_keys([steps], top)[0]
 
 def analyze_scales_for_chord(root_note, chord_type):
     """Use OpenAI to determine which scales can be played over a given chord"""
+    return call_llm(analyze_scales_for_chord_async(root_note, chord_type))
+
+async def analyze_scales_for_chord_async(root_note, chord_type):
+    """analyze_scales_for_chord() as a coroutine for the LLM loop"""
     try:
         prompt = f"""
         Given a {root_note} {chord_type} chord, what scales would be suitable for improvisation over this chord?
@@ -522,9 +2722,10 @@ def analyze_scales_for_chord(root_note, chord_type):
         Return only valid JSON, no additional text.
         """
         
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        client = get_async_openai()
+        response = await client.chat.completions.create(
+            model=SCALE_MODEL,
+            timeout=SCALE_TIMEOUT,
             messages=[
                 {"role": "system", "content": "You are a music theory expert specializing in scale selection for chord improvisation."},
                 {"role": "user", "content": prompt}
@@ -545,7 +2746,7 @@ def analyze_scales_for_chord(root_note, chord_type):
                 content = content[:-3]
             
             scale_data = json.loads(content.strip())
-            return {"success": True, "data": scale_data}
+            return {"success": True, "source": "openai", "data": scale_data}
             
         except json.JSONDecodeError as e:
             print(f"JSON parsing failed for scales: {e}")
@@ -560,69 +2761,177 @@ def analyze_scales_for_chord(root_note, chord_type):
 
 def get_fallback_scales(root_note, chord_type):
     """Provide fallback scales when OpenAI fails"""
-    if chord_type == "major":
-        return {
-            "success": True,
-            "data": {
-                "scales": [
-                    {
-                        "name": f"{root_note} Major Pentatonic",
-                        "notes": [root_note, get_note_at_interval(root_note, 2), get_note_at_interval(root_note, 4), 
-                                 get_note_at_interval(root_note, 7), get_note_at_interval(root_note, 9)],
-                        "description": "Bright, happy sound that works well over major chords"
-                    },
-                    {
-                        "name": f"{root_note} Major (Ionian)",
-                        "notes": [root_note, get_note_at_interval(root_note, 2), get_note_at_interval(root_note, 4),
-                                 get_note_at_interval(root_note, 5), get_note_at_interval(root_note, 7),
-                                 get_note_at_interval(root_note, 9), get_note_at_interval(root_note, 11)],
-                        "description": "The major scale - safe choice for major chords"
-                    }
-                ]
-            }
-        }
-    elif chord_type == "minor":
-        return {
-            "success": True,
-            "data": {
-                "scales": [
-                    {
-                        "name": f"{root_note} Minor Pentatonic",
-                        "notes": [root_note, get_note_at_interval(root_note, 3), get_note_at_interval(root_note, 5),
-                                 get_note_at_interval(root_note, 7), get_note_at_interval(root_note, 10)],
-                        "description": "Dark, bluesy sound perfect for minor chords"
-                    },
-                    {
-                        "name": f"{root_note} Natural Minor (Aeolian)",
-                        "notes": [root_note, get_note_at_interval(root_note, 2), get_note_at_interval(root_note, 3),
-                                 get_note_at_interval(root_note, 5), get_note_at_interval(root_note, 7),
-                                 get_note_at_interval(root_note, 8), get_note_at_interval(root_note, 10)],
-                        "description": "The natural minor scale - great for minor chords"
-                    }
-                ]
-            }
-        }
-    else:
-        return {
-            "success": True,
-            "data": {
-                "scales": [
-                    {
-                        "name": f"{root_note} Major Pentatonic",
-                        "notes": [root_note, get_note_at_interval(root_note, 2), get_note_at_interval(root_note, 4),
-                                 get_note_at_interval(root_note, 7), get_note_at_interval(root_note, 9)],
-                        "description": "Versatile scale that works over many chord types"
-                    }
-                ]
-            }
+    return suggest_scales_locally(root_note, chord_type)
+
+# Catalog order breaks ties; the prior favours scales players reach for first
+SCALE_CATALOG = [
+    ("Major Pentatonic", 1.0, "Bright, happy sound that works well over major chords"),
+    ("Minor Pentatonic", 1.0, "Dark, bluesy sound perfect for minor chords"),
+    ("Major (Ionian)", 1.0, "The major scale - safe choice for major chords"),
+    ("Natural Minor (Aeolian)", 0.9, "The natural minor scale - great for minor chords"),
+    ("Dorian", 0.9, "Minor scale with a raised 6th - the classic sound over minor 7th chords"),
+    ("Mixolydian", 0.9, "Major scale with flat 7th, great for dominant 7th chords"),
+    ("Blues", 0.9, "Minor pentatonic plus the flat 5th blue note"),
+    ("Lydian", 0.7, "Major scale with a raised 4th - dreamy, open sound without an avoid note"),
+    ("Major Blues", 0.7, "Major pentatonic with a passing minor 3rd for a country-blues flavour"),
+    ("Harmonic Minor", 0.7, "Minor scale with a raised 7th - exotic, classical tension"),
+    ("Melodic Minor", 0.7, "Minor scale with raised 6th and 7th - smooth jazz minor sound"),
+    ("Phrygian", 0.5, "Minor scale with a flat 2nd - dark, Spanish flavour"),
+    ("Locrian", 0.5, "Diminished-5th mode - the standard choice over half-diminished chords"),
+    ("Altered", 0.6, "Every tension of a dominant chord - maximum pull to resolve"),
+    ("Half-Whole Diminished", 0.6, "Symmetric scale with b9, #9 and #11 - for tense dominant chords"),
+    ("Whole-Half Diminished", 0.6, "Symmetric scale built from the diminished 7th chord"),
+    ("Whole Tone", 0.5, "All whole steps - floating, ambiguous sound for augmented chords"),
+    ("Dominant Bebop", 0.6, "Mixolydian with a passing major 7th so chord tones land on the beat"),
+    ("Major Bebop", 0.5, "Major scale with a passing #5 so chord tones land on the beat"),
+    ("Dorian Bebop", 0.4, "Dorian with a passing major 3rd so chord tones land on the beat"),
+    ("Lydian Dominant", 0.4, "Mixolydian with a raised 4th - bright dominant sound"),
+    ("Mixolydian b6", 0.3, "Mixolydian with a flat 6th - dominant resolving to minor"),
+    ("Phrygian Dominant", 0.4, "Phrygian with a major 3rd - flamenco and klezmer dominant sound"),
+    ("Locrian #2", 0.4, "Locrian with a natural 2nd - smoother half-diminished sound"),
+    ("Lydian Augmented", 0.3, "Lydian with a raised 5th - for major chords with a #5"),
+    ("Dorian b2", 0.3, "Dorian with a flat 2nd - dark minor sound"),
+    ("Locrian #6", 0.2, "Locrian with a natural 6th"),
+    ("Ionian #5", 0.2, "Major scale with a raised 5th - for augmented major chords"),
+    ("Dorian #4", 0.2, "Dorian with a raised 4th - Romanian minor sound"),
+    ("Lydian #2", 0.2, "Lydian with a raised 2nd - bright and exotic"),
+    ("Altered Diminished", 0.2, "Diminished scale shape from the harmonic minor's 7th degree"),
+]
+SCALE_COVERAGE_MIN = 0.75  # share of the chord tones a suggested scale has to contain
+
+def normalize_scale_chord(root_note, chord_type):
+    """Root note and chord type of a chord request, the root's case fixed and unknown chord types read as major
+
+    Raises ValueError for a root note it doesn't know.
+    """
+    root_note = root_note[:1].upper() + root_note[1:].lower()
+    if chord_type not in CHORD_PATTERNS:
+        chord_type = "major"  # Default to major
+    check_scale_chord(root_note, chord_type)
+    return root_note, chord_type
+
+def check_scale_chord(root_note, chord_type):
+    """Raise ValueError unless scales can be suggested for this root note and chord type"""
+    if root_note not in NOTE_INDEX:
+        raise ValueError(f"Unknown root note: {root_note!r}")
+    if chord_type not in CHORD_PATTERNS:
+        raise ValueError(f"Unknown chord type: {chord_type!r}")
+
+# Keyed on pitch class, so Bb and A# share an entry and the cache holds at most every chord of every key
+@functools.lru_cache(maxsize=12 * len(CHORD_PATTERNS))
+def _rank_scales(root, chord_type, limit):
+    chord = CHORD_MASKS[chord_type].transpose(root)
+    half_step_above = PitchClassSet(chord.transpose(1).mask & ~chord.mask)
+    ranked = []
+    for order, (name, prior, description) in enumerate(SCALE_CATALOG):
+        scale = SCALE_MASKS[name].transpose(root)
+        coverage = len(chord.intersection(scale)) / len(chord)
+        if coverage < SCALE_COVERAGE_MIN:
+            continue
+        # A chord tone the scale lacks mustn't be replaced by its neighbour, like G for the Gb of Cdim7
+        missing = PitchClassSet(chord.mask & ~scale.mask)
+        if scale.mask & ~chord.mask & (missing.transpose(1).mask | missing.transpose(-1).mask):
+            continue
+        avoid = len(scale.intersection(half_step_above))
+        ranked.append((-(4 * coverage - 0.5 * avoid + prior), order, name, tuple(scale.note_names()), description))
+    ranked.sort()
+    return tuple((name, notes, description) for _, _, name, notes, description in ranked[:limit])
+
+def rank_scales(root_note, chord_type, limit=SCALE_SUGGESTIONS):
+    """Catalog scales on a chord's root, best first, as (name, note names, description) tuples
+
+    A scale scores for every chord tone it contains and loses for every avoid
+    note, a non-chord tone a half step above a chord tone. A scale missing a
+    chord tone is only offered if it has neither note a half step from it.
+    Raises ValueError for a root note or chord type it doesn't know.
+    """
+    check_scale_chord(root_note, chord_type)
+    return tuple((f"{root_note} {name}", notes, description)
+                 for name, notes, description in _rank_scales(NOTE_INDEX[root_note], chord_type, limit))
+
+def suggest_scales_locally(root_note, chord_type, limit=SCALE_SUGGESTIONS):
+    """Scales for improvising over a chord, from the built-in catalog, shaped like the OpenAI answer"""
+    return {
+        "success": True,
+        "source": "local",
+        "data": {
+            "scales": [{"name": name, "notes": list(notes), "description": description}
+                       for name, notes, description in rank_scales(root_note, chord_type, limit)]
         }
+    }
+
+def _scale_cache_key(root_note, chord_type):
+    """Cache key of a chord, with the root spelled as in NOTE_NAMES so Bb and A# share answers"""
+    return f"{NOTE_NAMES[NOTE_INDEX[root_note]]} {chord_type}"
+
+def _ask_scales(root_note, chord_type):
+    """Model scales for a chord, or None when only the local fallback answered"""
+    result = analyze_scales_for_chord(root_note, chord_type)
+    return result["data"] if result.get("source") == "openai" else None
+
+def cached_scale_suggestions(root_note, chord_type):
+    """OpenAI scale suggestions served from the LLM cache
+
+    A stale answer is returned at once and refreshed in the background. On a
+    miss the local engine answers while the model is asked in the background,
+    so a request never waits on OpenAI; `flask --app app warm-scale-cache`
+    fills the cache ahead of time. Chords outside NOTE_INDEX and
+    CHORD_PATTERNS raise ValueError before the cache or the model is asked.
+    """
+    check_scale_chord(root_note, chord_type)
+    key = _scale_cache_key(root_note, chord_type)
+    root_note = NOTE_NAMES[NOTE_INDEX[root_note]]
+    try:
+        data, stale = llm_cache.get("scales", key, SCALE_PROMPT_VERSION, SCALE_MODEL, SCALE_CACHE_TTL)
+    except sqlite3.Error as e:
+        print(f"⚠️ LLM cache read failed: {e}")
+        return suggest_scales_locally(root_note, chord_type)
+    if data is None or stale:
+        llm_cache.refresh("scales", key, SCALE_PROMPT_VERSION, SCALE_MODEL,
+                          lambda: _ask_scales(root_note, chord_type))
+    if data is None:
+        return suggest_scales_locally(root_note, chord_type)
+    return {"success": True, "source": "openai", "cached": True, "stale": stale, "data": data}
+
+def get_scale_suggestions(root_note, chord_type, source=SCALE_SOURCE):
+    """Scale suggestions from the local engine, or from OpenAI (through its cache) when `source` asks for it"""
+    if source == "openai":
+        return cached_scale_suggestions(root_note, chord_type)
+    return suggest_scales_locally(root_note, chord_type)
 
 def get_note_at_interval(root_note, semitones):
     """Get note at a given interval from root note"""
-    notes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    root_index = notes.index(root_note)
-    note_index = (root_index + semitones) % 12
-    return notes[note_index]
+    return NOTE_NAMES[PitchClassSet.from_intervals(NOTE_INDEX[root_note], (0,)).transpose(semitones).root]
+
+def scale_to_midi_notes(scale_notes):
+    """Map scale note names to ascending MIDI notes from the root at octave 4, ending on the root an octave up"""
+    midi_notes = []
+    for note in scale_notes:
+        pitch_class = NOTE_INDEX.get(note)
+        if pitch_class is None:
+            print(f"Warning: Could not convert note '{note}' to MIDI")
+            continue
+        if not midi_notes:
+            midi_notes.append(60 + pitch_class)
+        else:
+            # Next occurrence of this pitch class above the previous note
+            midi_notes.append(midi_notes[-1] + (pitch_class - midi_notes[-1] - 1) % 12 + 1)
+    
+    if not midi_notes:
+        return midi_notes
+    
+    # Add the root note (ground tone) as the last note, one octave above the start
+    midi_notes.append(midi_notes[0] + 12 * ((midi_notes[-1] - midi_notes[0]) // 12 + 1))
+    return midi_notes
+
+def scale_events(midi_notes, duration, velocity):
+    """Note events (seconds, note, velocity) matching the device scale playback timing"""
+    events = []
+    cursor = 0.0
+    for note in midi_notes:
+        events += chord_events([note], cursor, duration + 0.2, velocity)
+        cursor += duration + 0.2 + 0.15
+    return events, cursor - 0.15 + 0.3
 
 def play_scale_notes(scale_notes, duration=0.5, velocity=80):
     """
@@ -637,235 +2946,528 @@ def play_scale_notes(scale_notes, duration=0.5, velocity=80):
         dict: Success status and method used for playback
     """
     try:
-        import fluidsynth
-        
-        # Get best driver for platform
-        driver = get_driver()
-        
-        # Initialize FluidSynth
-        sf2 = "./piano.sf2"
-        fs = fluidsynth.Synth()
-        fs.start(driver=driver)
-        
-        # Load SoundFont
-        sfid = fs.sfload(sf2)
-        fs.program_select(0, sfid, 0, 0)
-        
         # Convert note names to MIDI numbers in ascending order within one octave
         # Start from the root note (first note) and build the scale ascending
         if not scale_notes:
             return {"success": False, "error": "No scale notes provided", "method": "audio"}
         
-        # Static mapping of notes to MIDI numbers across three octaves (C3 to C6)
-        # This ensures consistent mapping and eliminates calculation errors
-        note_to_midi = {
-            # Octave 3 (C3 = 48) - Lower range for some scales
-            "C3": 48, "C#3": 49, "D3": 50, "D#3": 51, "E3": 52, "F3": 53, "F#3": 54, "G3": 55, "G#3": 56, "A3": 57, "A#3": 58, "B3": 59,
-            # Octave 4 (C4 = 60) - Standard starting octave for most scales
-            "C4": 60, "C#4": 61, "D4": 62, "D#4": 63, "E4": 64, "F4": 65, "F#4": 66, "G4": 67, "G#4": 68, "A4": 69, "A#4": 70, "B4": 71,
-            # Octave 5 (C5 = 72) - Upper range for scale progression
-            "C5": 72, "C#5": 73, "D5": 74, "D#5": 75, "E5": 76, "F5": 77, "F#5": 78, "G5": 79, "G#5": 80, "A5": 81, "A#5": 82, "B5": 83,
-            # Octave 6 (C6 = 84) - Final octave for completing scales
-            "C6": 84, "C#6": 85, "D6": 86, "D#6": 87, "E6": 88, "F6": 89, "F#6": 90, "G6": 91, "G#6": 92, "A6": 93, "A#6": 94, "B6": 95
-        }
-        
-        # Handle enharmonic equivalents
-        enharmonic_map = {"Db": "C#", "Eb": "D#", "Gb": "F#", "Ab": "G#", "Bb": "A#"}
-        
-        # Find the root note and determine starting octave
-        root_note = scale_notes[0]
-        root_note_clean = enharmonic_map.get(root_note, root_note)
+        midi_notes = scale_to_midi_notes(scale_notes)
         
-        # Build the scale by mapping each note to the appropriate octave
-        midi_notes = []
-        current_octave = 4  # Start with octave 4
+        # Also add the root note to the scale notes for display purposes
+        scale_notes.append(scale_notes[0])  # Add the root note again at the end
         
-        for note in scale_notes:
-            # Clean the note name (handle enharmonic equivalents)
-            clean_note = enharmonic_map.get(note, note)
-            
-            # Try to find the note in the current octave
-            note_key = f"{clean_note}{current_octave}"
+        # Play each note in sequence with proper timing
+        pool = get_synth_pool()
+        with pool.synth() as (fs, channel, wait):
+            for i, note in enumerate(midi_notes):
+                fs.noteon(channel, note, velocity)
+                # Use a longer duration for each note to make it audible
+                time.sleep(duration + 0.2)  # Increase duration to ensure notes are heard
+                fs.noteoff(channel, note)
+                # Small pause between notes (except after the last note)
+                if i < len(midi_notes) - 1:
+                    time.sleep(0.15)  # Slightly longer pause between notes
             
-            if note_key in note_to_midi:
-                midi_notes.append(note_to_midi[note_key])
-            else:
-                # If note not found, try the next octave
-                current_octave += 1
-                note_key = f"{clean_note}{current_octave}"
-                if note_key in note_to_midi:
-                    midi_notes.append(note_to_midi[note_key])
-                else:
-                    print(f"Warning: Could not convert note '{note}' to MIDI")
-                    continue
+            # Ensure the last note is fully heard before returning the synth
+            time.sleep(0.3)
         
-        # Sort the MIDI notes to ensure ascending order
-        midi_notes.sort()
+        return {"success": True, "method": "audio", "driver": pool.driver, "pool_wait_ms": round(wait * 1000, 3)}
         
-        # Add the root note (ground tone) as the last note, one octave up
-        # Find the appropriate octave for the final root note
-        final_root_octave = 4  # Start with octave 4
-        final_root_key = f"{root_note_clean}{final_root_octave}"
+    except Exception as e:
+        print(f"Scale playback failed: {e}")
+        return {"success": False, "error": str(e), "method": "audio"}
+
+def render_scale_audio(scale_notes, duration=0.5, velocity=80, audio_format=AUDIO_FORMAT):
+    """Render scale notes offline with the same timing as play_scale_notes()"""
+    try:
+        if not scale_notes:
+            return {"success": False, "error": "No scale notes provided", "method": "offline"}
         
-        # Find an octave that's higher than the highest note we have
-        if midi_notes:
-            highest_so_far = max(midi_notes)
-            while note_to_midi.get(final_root_key, 0) <= highest_so_far:
-                final_root_octave += 1
-                final_root_key = f"{root_note_clean}{final_root_octave}"
+        start = time.perf_counter()
+        midi_notes = scale_to_midi_notes(scale_notes)
+        scale_notes.append(scale_notes[0])  # Add the root note again at the end
         
-        # Add the final root note
-        if final_root_key in note_to_midi:
-            midi_notes.append(note_to_midi[final_root_key])
-        else:
-            # Fallback: just add 12 semitones to the highest note
-            midi_notes.append(highest_so_far + 12)
+        events, length = scale_events(midi_notes, duration, velocity)
+        pcm, tier = render_cache.get_or_render(
+            "scale", midi_notes, duration, velocity,
+            lambda: render_events(events, length + RELEASE_TAIL))
+        return {"success": True, "method": "offline", "audio": audio_response(pcm, audio_format),
+                "cache": tier, "render_ms": round((time.perf_counter() - start) * 1000, 3)}
         
-        # Also add the root note to the scale notes for display purposes
-        scale_notes.append(scale_notes[0])  # Add the root note again at the end
+    except Exception as e:
+        print(f"⚠️ Offline scale render failed: {e}")
+        return {"success": False, "error": str(e), "method": "offline"}
+
+def build_song_progression(progression, voice_leading=VOICE_LEADING):
+    """Display info and sequencer steps for an analyzed song's progression"""
+    progression_info = []
+    steps = []
+    
+    # Parse chord strings and play every interval they spell; only the upper voices are revoiced
+    parsed = [parse_playable_chord(chord_data.get("chord", "C major")) for chord_data in progression]
+    chords = [parsed_chord_notes(chord) for chord in parsed]
+    if voice_leading:
+        chords = voice_lead(chords)
+    chords = [add_bass_note(chord_notes, chord.bass) for chord_notes, chord in zip(chords, parsed)]
+    
+    for chord_data, chord, chord_notes in zip(progression, parsed, chords):
+        chord_string = chord_data.get("chord", "C major")
+        duration = float(chord_data.get("duration", 2.0))
+        bar = chord_data.get("bar", len(progression_info) + 1)
         
-        # Debug: Print the actual MIDI notes being generated (optional)
-        # print(f"Scale notes: {scale_notes}")
-        # print(f"Generated MIDI notes: {midi_notes}")
-        # print(f"Note names: {[get_note_name(note) for note in midi_notes]}")
+        note_names = [get_note_name(note) for note in chord_notes]
         
-        # Play each note in sequence with proper timing
-        for i, note in enumerate(midi_notes):
-            fs.noteon(0, note, velocity)
-            # Use a longer duration for each note to make it audible
-            time.sleep(duration + 0.2)  # Increase duration to ensure notes are heard
-            fs.noteoff(0, note)
-            # Small pause between notes (except after the last note)
-            if i < len(midi_notes) - 1:
-                time.sleep(0.15)  # Slightly longer pause between notes
+        # Calculate how many times to play this chord based on 4/4 time
+        # In 4/4 time, each bar has 4 beats
+        # If duration is 1 beat, play 4 times; if 2 beats, play 2 times; if 4 beats, play 1 time
+        beats_per_bar = 4  # 4/4 time signature
+        chord_beats = duration
+        play_count = int(beats_per_bar / chord_beats)
         
-        # Ensure the last note is fully heard before cleanup
-        time.sleep(0.3)
+        # Ensure minimum play count of 1
+        play_count = max(1, play_count)
         
-        fs.delete()
-        return {"success": True, "method": "audio", "driver": driver}
+        progression_info.append({
+            "bar": bar,
+            "chord": chord_string,
+            "parsed_chord": f"{chord.root} {chord.chord_type}",
+            "notes": note_names,
+            "midi_notes": chord_notes,
+            "duration": duration,
+            "play_count": play_count,
+            "beats": chord_beats
+        })
         
-    except Exception as e:
-        print(f"Scale playback failed: {e}")
-        return {"success": False, "error": str(e), "method": "audio"}
+        # Strike the chord multiple times based on its beat duration
+        for play in range(play_count):
+            steps.append({"notes": chord_notes, "beats": chord_beats})
+        steps[-play_count]["marker"] = {"index": len(progression_info) - 1, "bar": bar, "chord": chord_string}
+    
+    return progression_info, steps
 
-@app.route('/analyze_song', methods=['POST'])
-def analyze_song():
-    """Analyze a song title and generate chord progression using OpenAI"""
+def run_song_analysis(data, progress=None, analysis_result=None):
+    """Analyze a song, play its progression and export it, returning the response payload
+
+    An async caller can pass the analysis it already awaited as analysis_result.
+    """
+    progress = progress or (lambda event, **payload: None)
     try:
-        data = request.get_json()
         song_title = data.get('song_title', '').strip()
         
         if not song_title:
-            return jsonify({
+            return {
                 "success": False,
                 "error": "No song title provided",
                 "message": "Please provide a song title to analyze"
-            })
+            }
         
         # Analyze song with OpenAI
-        analysis_result = analyze_song_with_openai(song_title)
+        if analysis_result is None:
+            analysis_result = get_song_analysis(song_title)
         
         if not analysis_result["success"]:
-            return jsonify({
+            return {
                 "success": False,
                 "error": analysis_result.get("error", "Unknown error"),
                 "message": f"Failed to analyze song '{song_title}'"
-            })
+            }
         
         progression_data = analysis_result["data"]
-        key = progression_data.get("key", "C")
+        reported_key = progression_data.get("key", "C")
         progression = progression_data.get("progression", [])
         total_bars = progression_data.get("total_bars", len(progression))
         description = progression_data.get("description", "")
         
         # Process each chord in the progression
-        progression_info = []
-        all_notes = []
         velocity = 96
+        bpm = float(data.get('bpm', 60))  # At 60 BPM a beat lasts one second
+        audio_mode = data.get('audio_mode', AUDIO_MODE)
+        audio_format = data.get('audio_format', AUDIO_FORMAT)
         
-        for chord_data in progression:
-            chord_string = chord_data.get("chord", "C major")
-            duration = float(chord_data.get("duration", 2.0))
-            bar = chord_data.get("bar", len(progression_info) + 1)
-            
-            # Parse chord string
-            root_note, chord_type = parse_chord_string(chord_string)
-            
-            # Get chord notes
-            chord_notes = get_chord_notes(chord_type, root_note)
-            note_names = [get_note_name(note) for note in chord_notes]
-            
-            # Calculate how many times to play this chord based on 4/4 time
-            # In 4/4 time, each bar has 4 beats
-            # If duration is 1 beat, play 4 times; if 2 beats, play 2 times; if 4 beats, play 1 time
-            beats_per_bar = 4  # 4/4 time signature
-            chord_beats = duration
-            play_count = int(beats_per_bar / chord_beats)
-            
-            # Ensure minimum play count of 1
-            play_count = max(1, play_count)
-            
-            progression_info.append({
-                "bar": bar,
-                "chord": chord_string,
-                "parsed_chord": f"{root_note} {chord_type}",
-                "notes": note_names,
-                "midi_notes": chord_notes,
-                "duration": duration,
-                "play_count": play_count,
-                "beats": chord_beats
-            })
-            
-            # Play the chord multiple times based on its beat duration
-            for play in range(play_count):
-                audio_result = generate_chord_audio(chord_notes, duration, velocity)
-                if audio_result["success"]:
-                    all_notes.extend(chord_notes)
-                else:
-                    # If audio fails, just collect the notes for MIDI
-                    all_notes.extend(chord_notes)
-                
-                # Small pause between repeated plays (except after the last one)
-                if play < play_count - 1:
-                    time.sleep(0.1)
+        progression_info, steps = build_song_progression(progression, data.get('voice_leading', VOICE_LEADING))
+        
+        # Trust the chords over the model's stated key
+        key_candidates = detect_key(steps) if steps else []
+        key = key_candidates[0]["key"] if key_candidates else reported_key
+        
+        progress("progression", song_title=song_title, key=key, progression=progression_info,
+                 total_bars=total_bars, description=description)
+        
+        audio_result = perform_sequence(steps, bpm, velocity, audio_mode, audio_format, progress)
         
         # Create MIDI file for the entire progression
-        total_duration = sum(chord.get("duration", 2.0) for chord in progression)
-        midi_result = create_midi_file(all_notes, total_duration, velocity)
+        midi_result = create_progression_midi_file(steps, bpm, velocity=velocity)
         
         if midi_result["success"]:
             result = {
                 "success": True,
                 "song_title": song_title,
                 "key": key,
+                "reported_key": reported_key,
+                "key_candidates": key_candidates,
                 "progression": progression_info,
                 "total_bars": total_bars,
                 "description": description,
+                "cache": analysis_result.get("cache"),
                 "method": "midi",
                 "file_path": midi_result["file_path"],
+                "download_url": midi_result["download_url"],
+                "audio": audio_result.get("audio"),
                 "message": f"Successfully analyzed and played '{song_title}' with beat-based timing! Created MIDI file for download."
             }
+            if not audio_result["success"]:
+                result["audio_error"] = audio_result.get("error", "Unknown")
+                result["message"] = f"Audio failed, created MIDI file for '{song_title}'"
         else:
             result = {
                 "success": False,
                 "song_title": song_title,
                 "key": key,
+                "reported_key": reported_key,
+                "key_candidates": key_candidates,
                 "progression": progression_info,
                 "total_bars": total_bars,
                 "description": description,
-                "error": midi_result.get("error", "Unknown"),
+                "cache": analysis_result.get("cache"),
+                "error": midi_error(audio_result, midi_result),
                 "message": f"Failed to create MIDI file for '{song_title}'"
             }
         
-        return jsonify(result)
+        return result
         
     except Exception as e:
-        return jsonify({
+        return {
             "success": False,
             "error": str(e),
             "message": "An error occurred while analyzing the song"
-        })
+        }
+
+@app.route('/analyze_song', methods=['POST'])
+async def analyze_song():
+    """Analyze a song title and generate chord progression using OpenAI"""
+    data = request.get_json() or {}
+    try:
+        bpm = float(data.get('bpm', 60))
+    except (TypeError, ValueError):
+        bpm = 0
+    if not MIDI_MIN_BPM <= bpm < float("inf"):
+        return jsonify({"success": False, "error": f"'bpm' must be a number from {MIDI_MIN_BPM:.2f} up"}), 400
+    if data.get('async'):
+        return submit_job("analyze_song", run_song_analysis, data)
+    song_title = data.get('song_title', '').strip()
+    try:
+        analysis_result = await await_llm(get_song_analysis_async(song_title)) if song_title else None
+    except Exception as e:
+        analysis_result = {"success": False, "error": str(e)}
+    return jsonify(run_song_analysis(data, analysis_result=analysis_result))
+
+_stream_slots = threading.BoundedSemaphore(STREAM_POOL_SIZE)
+
+def stream_sequence(steps, bpm, velocity=96):
+    """Chunked WAV response that renders a progression bar by bar while it is sent
+
+    The first bytes go out as soon as the first bar is rendered. Chunks are
+    cut at every bar and at most STREAM_CHUNK_SECONDS apart, and only
+    STREAM_BUFFER_CHUNKS of them are ever held, whatever the song's length.
+    Each stream renders on the stream synth pool and at most STREAM_POOL_SIZE
+    run at once; beyond that the request is refused with 503 rather than
+    left waiting for a synth.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({"success": False,
+                        "error": f"All {STREAM_POOL_SIZE} audio streams are busy, try again shortly"}), 503
+    chunks = None
+    try:
+        events, total_ticks = compile_progression(steps, velocity=velocity)
+        timed = [(ticks_to_seconds(tick, bpm), note, vel) for tick, note, vel in events]
+        total_seconds = ticks_to_seconds(total_ticks, bpm) + RELEASE_TAIL
+        splits = {ticks_to_seconds(tick, bpm) for tick, _ in progression_markers(steps)}
+        splits |= set(np.arange(STREAM_CHUNK_SECONDS, total_seconds, STREAM_CHUNK_SECONDS).tolist())
+        chunks = buffered(iter_render_events(timed, total_seconds, sorted(splits), pool=get_synth_pool(stream=True)))
+
+        def generate():
+            try:
+                yield wav_stream_header()
+                for chunk in chunks:
+                    yield pcm_to_int16(chunk).tobytes()
+            finally:
+                chunks.close()
+
+        released = threading.Event()
+
+        def release():
+            # Runs when the response is closed, even if the client left before the body started
+            chunks.close()
+            if not released.is_set():
+                released.set()
+                _stream_slots.release()
+
+        response = Response(stream_with_context(generate()), mimetype="audio/wav",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        response.call_on_close(release)
+    except BaseException:
+        # The slot is only handed to call_on_close once the response exists
+        if chunks is not None:
+            chunks.close()
+        _stream_slots.release()
+        raise
+    return response
+
+@app.route('/stream/12bar_blues')
+def stream_12bar_blues():
+    """Stream a 12-bar blues as WAV, rendered bar by bar"""
+    root_note = request.args.get('root_note', 'C')
+    try:
+        duration = float(request.args.get('duration', 1.0))
+        velocity = int(request.args.get('velocity', 96))
+    except ValueError:
+        return jsonify({"success": False, "error": "'duration' must be a number and 'velocity' an integer"}), 400
+    if root_note not in NOTE_INDEX:
+        return jsonify({"success": False, "error": f"Unknown root note: {root_note!r}"}), 400
+    if not 0 < duration < float("inf") or not 1 <= velocity <= 127:
+        return jsonify({"success": False, "error": "'duration' must be positive and 'velocity' from 1 to 127"}), 400
+    progression_info, steps = build_12bar_blues(root_note)
+    # Each 4-beat bar lasts `duration` seconds
+    return stream_sequence(steps, 240.0 / duration, velocity)
+
+@app.route('/stream/song')
+def stream_song():
+    """Analyze a song and stream its progression as WAV, rendered bar by bar"""
+    song_title = request.args.get('song_title', '').strip()
+    if not song_title:
+        return jsonify({"success": False, "error": "No song title provided"}), 400
+    try:
+        bpm = float(request.args.get('bpm', 60))
+    except ValueError:
+        bpm = 0
+    if not 0 < bpm < float("inf"):
+        return jsonify({"success": False, "error": "'bpm' must be a positive number"}), 400
+    analysis_result = get_song_analysis(song_title)
+    if not analysis_result["success"]:
+        return jsonify({"success": False, "error": analysis_result.get("error", "Unknown error")}), 502
+    progression_info, steps = build_song_progression(analysis_result["data"].get("progression", []))
+    return stream_sequence(steps, bpm)
+
+EXPORT_KEYS = list(NOTE_NAMES.values())
+EXPORT_FORMATS = {"mid": zipfile.ZIP_DEFLATED, "wav": zipfile.ZIP_DEFLATED, "flac": zipfile.ZIP_STORED}
+export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="chords-export")
+
+def build_symbol_progression(symbols, beats=4):
+    """Sequencer steps for a list of chord symbols like ["C", "Am7", "G7"], `beats` each"""
+    steps = []
+    for symbol in symbols:
+        chord = parse_playable_chord(symbol)
+        steps.append({"notes": add_bass_note(parsed_chord_notes(chord), chord.bass), "beats": beats})
+    return steps
+
+def export_key(name):
+    """Sharp spelling of a key name like "Bb" or "G minor", or None if it isn't one"""
+    if not name or not name.strip():
+        return None
+    try:
+        return parse_chord_symbol(name).root
+    except ValueError:
+        return None
+
+def transpose_steps(steps, semitones):
+    """Copy of progression steps moved by a number of semitones"""
+    return [dict(step, notes=[note + semitones for note in step["notes"]]) for step in steps]
+
+def render_export_entry(steps, bpm, velocity, fmt):
+    """File contents of one export entry"""
+    if fmt == "mid":
+        return encode_progression_midi(steps, bpm, velocity=velocity)
+    return encode_audio(render_progression(steps, bpm, velocity), fmt)
+
+class ZipStreamSink(io.RawIOBase):
+    """Write-only, unseekable file that collects zip output until it is drained
+
+    zipfile notices that it cannot seek and writes data descriptors after
+    each entry instead, so the archive can go out while it is being built.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def ordered_parallel(tasks, executor, lookahead=EXPORT_LOOKAHEAD):
+    """Run (fn, *args) tasks on an executor and yield their futures in order
+
+    At most `lookahead` tasks are queued or finished but not yet consumed,
+    so memory stays bounded however many tasks there are.
+    """
+    pending = deque()
+    try:
+        for fn, *args in tasks:
+            pending.append(executor.submit(fn, *args))
+            if len(pending) >= lookahead:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def export_progression_error(item):
+    """Why a requested export progression can't be rendered, or None if it can"""
+    if not isinstance(item, dict):
+        return "Every progression must be an object"
+    chords = item.get("chords")
+    if not isinstance(chords, list) or not chords or not all(isinstance(chord, str) for chord in chords):
+        return "Every progression needs a list of chord symbols as 'chords'"
+    if not all(isinstance(item.get(field, ""), str) for field in ("name", "key")):
+        return "A progression's 'name' and 'key' must be strings"
+    if item.get("key") and export_key(item["key"]) is None:
+        return f"Unknown key name: {item['key']!r}"
+    try:
+        bpm, beats = float(item.get("bpm", 120)), float(item.get("beats", 4))
+        velocity = int(item.get("velocity", 96))
+    except (TypeError, ValueError):
+        return "'bpm' and 'beats' must be numbers and 'velocity' an integer"
+    if not 0 < bpm < float("inf") or not 0 < beats < float("inf"):
+        return "'bpm' and 'beats' must be positive"
+    if not 1 <= velocity <= 127:
+        return "'velocity' must be from 1 to 127"
+    return None
+
+def export_items(progressions, song_titles, errors):
+    """(name, steps, bpm, velocity, source key) for every item of an export, analyzing songs as they come up
+
+    An item that can't be built is reported in `errors` and skipped, so the rest still export.
+    """
+    for index, item in enumerate(progressions, 1):
+        name = item.get("name") or f"progression_{index}"
+        try:
+            steps = build_symbol_progression(item["chords"], float(item.get("beats", 4)))
+            # Without a key, the root the first chord is played on
+            key = export_key(item["key"]) if item.get("key") else parse_playable_chord(item["chords"][0]).root
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+            continue
+        yield name, steps, float(item.get("bpm", 120)), int(item.get("velocity", 96)), key
+    for song_title in song_titles:
+        try:
+            analysis_result = get_song_analysis(song_title)
+            if not analysis_result["success"]:
+                raise ValueError(f"Failed to analyze song '{song_title}': {analysis_result.get('error', 'Unknown error')}")
+            progression_data = analysis_result["data"]
+            progression_info, steps = build_song_progression(progression_data.get("progression", []))
+            key = export_key(detect_key(steps, top=1)[0]["tonic"]) if steps else "C"
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        yield song_title, steps, 60.0, 96, key
+
+def unique_file_name(name, taken):
+    """`name` reduced to word characters, dashes and spaces so it can't leave its directory, unique among `taken`
+
+    The returned name is added to `taken`.
+    """
+    stem = re.sub(r"[^\w\- ]+", "", str(name)).strip() or "untitled"
+    while stem in taken:
+        stem += "_"
+    taken.add(stem)
+    return stem
+
+def export_zip(progressions, song_titles, formats, keys):
+    """Generate a ZIP archive of every item × key × format, entry by entry"""
+    names = set()
+    errors = []
+
+    def entries():
+        for name, steps, bpm, velocity, source_key in export_items(progressions, song_titles, errors):
+            folder = unique_file_name(name, names)
+            for key in keys or [source_key]:
+                # Move by the smallest interval so every key stays near the original register
+                shift = (NOTE_INDEX[key] - NOTE_INDEX[source_key] + 6) % 12 - 6
+                for fmt in formats:
+                    arcname = f"{folder}/{folder}_{key.replace('#', 's')}.{fmt}"
+                    yield arcname, render_export_entry, transpose_steps(steps, shift), bpm, velocity, fmt
+
+    def generate():
+        sink = ZipStreamSink()
+        arcnames = []
+
+        def tasks():
+            for arcname, *task in entries():
+                arcnames.append(arcname)
+                yield task
+
+        futures = ordered_parallel(tasks(), export_executor)
+        try:
+            with zipfile.ZipFile(sink, "w") as archive:
+                for index, future in enumerate(futures):
+                    arcname = arcnames[index]
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        errors.append(f"{arcname}: {e}")
+                        continue
+                    archive.writestr(arcname, data, compress_type=EXPORT_FORMATS[arcname.rsplit(".", 1)[1]])
+                    yield sink.drain()
+                if errors:
+                    archive.writestr("errors.txt", "\n".join(errors) + "\n")
+            yield sink.drain()
+        finally:
+            futures.close()
+
+    return generate()
+
+@app.route('/export', methods=['POST'])
+def export():
+    """Stream a ZIP of progressions and analyzed songs in several keys and formats"""
+    try:
+        data = request.get_json()
+        progressions = data.get('progressions', [])
+        # A single title, format or key may be given as a plain string
+        song_titles, formats, keys = ([value] if isinstance(value, str) else value for value in
+                                      (data.get('song_titles', []), data.get('formats', ['mid']), data.get('keys', [])))
+        if not isinstance(progressions, list):
+            return jsonify({"success": False, "error": "'progressions' must be a list"}), 400
+        if not all(isinstance(value, list) and all(isinstance(entry, str) for entry in value)
+                   for value in (song_titles, formats, keys)):
+            return jsonify({"success": False,
+                            "error": "'song_titles', 'formats' and 'keys' must be strings or lists of strings"}), 400
+        song_titles = [title.strip() for title in song_titles if title.strip()]
+        
+        if not progressions and not song_titles:
+            return jsonify({"success": False, "error": "No progressions or song titles provided"}), 400
+        error = next(filter(None, map(export_progression_error, progressions)), None)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+        unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unknown or not formats:
+            return jsonify({"success": False, "error": f"Unsupported formats: {unknown}",
+                            "formats": sorted(EXPORT_FORMATS)}), 400
+        
+        unknown = [key for key in keys if export_key(key) is None] if keys != ["all"] else []
+        if unknown:
+            return jsonify({"success": False, "error": f"Unknown key names: {unknown}"}), 400
+        keys = EXPORT_KEYS if keys == ["all"] else [export_key(key) for key in keys]
+        
+        entries = (len(progressions) + len(song_titles)) * max(1, len(keys)) * len(formats)
+        if entries > EXPORT_MAX_ENTRIES:
+            return jsonify({"success": False,
+                            "error": f"Export would hold {entries} files, the limit is {EXPORT_MAX_ENTRIES}"}), 400
+        
+        return Response(stream_with_context(export_zip(progressions, song_titles, formats, keys)),
+                        mimetype="application/zip",
+                        headers={"Content-Disposition": 'attachment; filename="chords_export.zip"',
+                                 "X-Accel-Buffering": "no"})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/play_scale', methods=['POST'])
 def play_scale():
@@ -875,6 +3477,8 @@ def play_scale():
         scale_notes = data.get('scale_notes', [])
         duration = float(data.get('duration', 0.5))
         velocity = int(data.get('velocity', 80))
+        audio_mode = data.get('audio_mode', AUDIO_MODE)
+        audio_format = data.get('audio_format', AUDIO_FORMAT)
         
         if not scale_notes:
             return jsonify({
@@ -884,14 +3488,18 @@ def play_scale():
             })
         
         # Play the scale
-        audio_result = play_scale_notes(scale_notes, duration, velocity)
+        if audio_mode == "offline":
+            audio_result = render_scale_audio(scale_notes, duration, velocity, audio_format)
+        else:
+            audio_result = play_scale_notes(scale_notes, duration, velocity)
         
         if audio_result["success"]:
             result = {
                 "success": True,
                 "scale_notes": scale_notes,
-                "method": "audio",
-                "driver": audio_result.get("driver", "unknown"),
+                "method": audio_result["method"],
+                "driver": audio_result.get("driver", "offline" if audio_mode == "offline" else "unknown"),
+                "audio": audio_result.get("audio"),
                 "message": f"Successfully played scale: {', '.join(scale_notes)}"
             }
         else:
@@ -911,22 +3519,309 @@ def play_scale():
             "message": "An error occurred while playing the scale"
         })
 
-@app.route('/download_midi')
-def download_midi():
-    """Download the generated MIDI file"""
+class Job:
+    """A background playback or rendering task and the progress events it has published"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    def publish(self, event, **payload):
+        """Record a progress event and wake any stream waiting for it"""
+        with self._cond:
+            self.events.append({"event": event, "data": payload})
+            self._cond.notify_all()
+
+    def wait_events(self, since, timeout):
+        """Events after index `since`, waiting up to `timeout` seconds for new ones"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.events) <= since and self.finished is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self.events[since:], self.finished is not None
+
+    def to_dict(self):
+        """Job status for the polling endpoint"""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.events[-1] if self.events else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps finished ones around for JOB_TTL seconds"""
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chords-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        """Queue fn(*args, progress=job.publish) and return its Job at once"""
+        self._prune()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        job.publish("status", status="running")
+        try:
+            job.result = fn(*args, progress=job.publish)
+            job.status = "finished" if job.result.get("success", True) else "failed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        with job._cond:
+            job.finished = time.time()
+            job.events.append({"event": "done", "data": {"status": job.status}})
+            job._cond.notify_all()
+
+    def _prune(self):
+        """Forget jobs that finished more than ttl seconds ago"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in set(statuses)}
+
+job_manager = JobManager()
+
+def submit_job(kind, fn, data):
+    """Start fn(data) as a background job and respond with where to follow it"""
+    job = job_manager.submit(kind, fn, data)
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "message": "Job started"
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll a background job's status and, once finished, its result"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent event stream of a job's progress, ending with a "done" event"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    # Resume after the last event a reconnecting EventSource saw
+    try:
+        since = max(int(request.headers.get("Last-Event-ID", -1)) + 1, 0)
+    except ValueError:
+        since = 0  # Unreadable id: replay from the first event
+
+    def stream():
+        index = since
+        while True:
+            events, finished = job.wait_events(index, timeout=15)
+            if not events:
+                if finished:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"id: {index}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                index += 1
+            if finished and index >= len(job.events):
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/stats')
+def stats():
+    """Report synth pool and audio cache statistics"""
+    stats = {f"{name}_synth_pool": pool.stats() for name, pool in _synth_pools.items()}
+    stats["audio_cache"] = render_cache.stats()
+    if _note_bank is not None:
+        stats["note_bank"] = _note_bank.stats()
+    stats["jobs"] = job_manager.stats()
+    stats["llm_cache"] = llm_cache.stats()
+    return jsonify(stats)
+
+@app.route('/download_midi/<digest>')
+def download_midi(digest):
+    """Download a generated MIDI file by its content hash"""
     try:
-        temp_dir = tempfile.gettempdir()
-        midi_path = os.path.join(temp_dir, "chord_output.mid")
+        midi_path = artifact_store.path(digest, ".mid")
         
-        if os.path.exists(midi_path):
-            return send_file(midi_path, as_attachment=True, download_name="chord_output.mid")
-        else:
+        if midi_path is None:
             return jsonify({"error": "MIDI file not found"}), 404
+        
+        # The URL names the content, so the response can be cached forever
+        response = send_file(midi_path, mimetype="audio/midi", as_attachment=True,
+                             download_name=f"chords_{digest[:12]}.mid", etag=digest, conditional=True)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Octaves a batch may voice chords from: every chord the grammar accepts, slash bass through
+# the 13th, fits on MIDI notes 0-127 from these
+CHORD_BATCH_OCTAVES = range(0, 7)
+
+def resolve_chords(symbols, root_octave=4, max_length=CHORD_SYMBOL_MAX_LENGTH):
+    """MIDI notes, note names and pitch-class masks of many chord symbols at once
+
+    Each distinct symbol is parsed once (and memoized across calls); the notes,
+    names and masks of all of them are then computed as padded arrays. A slash
+    bass is voiced below the root. Returns one dict per symbol, in order, with
+    an "error" instead of notes for symbols that don't parse or are longer
+    than `max_length` characters.
+    """
+    distinct = {}
+    symbols = [str(symbol).strip() for symbol in symbols]
+    inverse = np.array([distinct.setdefault(symbol, len(distinct)) for symbol in symbols], dtype=np.intp)
+    parsed, errors = [], {}
+    for index, symbol in enumerate(distinct):
+        if len(symbol) > max_length:
+            parsed.append(None)
+            errors[index] = f"Chord symbols are limited to {max_length} characters"
+            continue
+        try:
+            parsed.append(parse_chord_symbol(symbol))
+        except ValueError as e:
+            parsed.append(None)
+            errors[index] = str(e)
+    
+    # (distinct, voices) intervals above the root, bass first when there is one (below the root, so
+    # negative), padded with -128
+    width = 1 + max((len(chord.intervals) for chord in parsed if chord), default=0)
+    intervals = np.full((len(parsed), width), -128, dtype=np.intp)
+    roots = np.zeros(len(parsed), dtype=np.intp)
+    for index, chord in enumerate(parsed):
+        if chord is None:
+            continue
+        roots[index] = NOTE_INDEX[chord.root]
+        voices = list(chord.intervals)
+        if chord.bass is not None and chord.bass != chord.root:
+            voices.insert(0, -((NOTE_INDEX[chord.root] - NOTE_INDEX[chord.bass]) % 12))
+        intervals[index, :len(voices)] = voices
+    
+    valid = intervals > -128
+    pitches = roots[:, None] + intervals
+    # Padding is mapped to note 0 so the name lookup stays in range; it's masked out below
+    midi = np.where(valid, 12 * (root_octave + 1) + pitches, 0)
+    names = NOTE_NAME_TABLE[midi]
+    
+    resolved = []
+    for index, (symbol, chord) in enumerate(zip(distinct, parsed)):
+        if chord is None:
+            resolved.append({"symbol": symbol, "error": errors[index]})
+            continue
+        row = valid[index]
+        resolved.append({
+            "symbol": symbol,
+            "root": chord.root,
+            "bass": chord.bass,
+            "quality": chord.quality,
+            "chord_type": chord.chord_type,
+            "midi_notes": midi[index, row].tolist(),
+            "note_names": names[index, row].tolist(),
+            "mask": chord.pitch_class_set().mask,
+        })
+    return [resolved[index] for index in inverse]
+
+@app.route('/api/chords/batch', methods=['POST'])
+def resolve_chords_batch():
+    """Resolve many chord symbols in one call, without audio or OpenAI"""
+    try:
+        data = request.get_json()
+        symbols = data.get('chords', [])
+        try:
+            root_octave = int(data.get('root_octave', 4))
+        except (TypeError, ValueError):
+            root_octave = None
+        
+        if root_octave not in CHORD_BATCH_OCTAVES:
+            return jsonify({"success": False, "error": f"'root_octave' must be an integer from "
+                            f"{CHORD_BATCH_OCTAVES.start} to {CHORD_BATCH_OCTAVES.stop - 1}"}), 400
+        if not isinstance(symbols, list) or not symbols:
+            return jsonify({"success": False, "error": "Provide a non-empty list of chord symbols as 'chords'"}), 400
+        if len(symbols) > CHORD_BATCH_MAX:
+            return jsonify({"success": False,
+                            "error": f"{len(symbols)} chords requested, the limit is {CHORD_BATCH_MAX}"}), 400
+        
+        chords = resolve_chords(symbols, root_octave)
+        return jsonify({"success": True, "count": len(chords), "max_symbol_length": CHORD_SYMBOL_MAX_LENGTH,
+                        "errors": sum("error" in chord for chord in chords), "chords": chords})
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/transpose_chord_sheet', methods=['POST'])
+def transpose_chord_sheet_route():
+    """Transpose a chord sheet for transposing instruments or by any interval"""
+    try:
+        data = request.get_json()
+        chord_sheet = data.get('chord_sheet', {})
+        if not isinstance(chord_sheet, dict) or not isinstance(chord_sheet.get('meta', {}), dict):
+            return jsonify({"success": False, "error": "'chord_sheet' must be an object"}), 400
+        chords = data.get('chords', chord_sheet.get('chords'))
+        key = data.get('key', chord_sheet.get('meta', {}).get('key', 'C major'))
+        targets = data.get('targets', list(TRANSPOSING_INSTRUMENTS))
+        # A single target may be given on its own, like "Bb" or -2
+        if isinstance(targets, (str, int)):
+            targets = [targets]
+        
+        if not chords:
+            return jsonify({"success": False, "error": "No chords provided"}), 400
+        if not isinstance(chords, dict) or not all(
+                isinstance(bars, list) and all(isinstance(bar, str) for bar in bars) for bars in chords.values()):
+            return jsonify({"success": False, "error": "'chords' must map section names to lists of bar strings"}), 400
+        if not isinstance(key, str):
+            return jsonify({"success": False, "error": "'key' must be a string like \"Eb major\""}), 400
+        if not isinstance(targets, list) or not all(
+                isinstance(target, (str, int)) and not isinstance(target, bool) for target in targets):
+            return jsonify({"success": False, "error": "'targets' must be a list of instrument names or semitones",
+                            "targets": list(TRANSPOSING_INSTRUMENTS) + ["semitones, e.g. 3 or -2"]}), 400
+        
+        try:
+            transposition = transpose_chord_sheet(chords, key, targets)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e),
+                            "targets": list(TRANSPOSING_INSTRUMENTS) + ["semitones, e.g. 3 or -2"]}), 400
+        
+        return jsonify({"success": True, "key": key, "transposition": transposition})
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/generate_chord_table', methods=['POST'])
-def generate_chord_table():
+async def generate_chord_table():
     """Generate a chord table in sheet music format with explanations using OpenAI"""
     try:
         data = request.get_json()
@@ -940,7 +3835,7 @@ def generate_chord_table():
             })
         
         # Use OpenAI to generate chord table and explanations
-        chord_table_result = generate_chord_table_with_openai(song_title)
+        chord_table_result = await await_llm(get_chord_sheet_async(song_title))
         
         if not chord_table_result["success"]:
             error_msg = chord_table_result.get("message", chord_table_result.get("error", "Unknown error"))
@@ -956,6 +3851,7 @@ def generate_chord_table():
             "success": True,
             "song_title": song_title,
             "chord_sheet": result_data.get("chord_sheet"),
+            "cache": chord_table_result.get("cache"),
             "message": f"Successfully generated chord sheet for '{song_title}'!"
         }
         
@@ -973,12 +3869,15 @@ def generate_chord_table():
 
 def generate_chord_table_with_openai(song_title):
     """Use OpenAI GPT-5 with Responses API to generate a complete chord sheet"""
+    return call_llm(generate_chord_table_with_openai_async(song_title))
+
+async def generate_chord_table_with_openai_async(song_title):
+    """generate_chord_table_with_openai() as a coroutine for the LLM loop"""
     try:
         SYSTEM_INSTRUCTIONS = """You are a meticulous music engraver.
-        Return ONLY valid JSON with keys: meta, chords, transposition, notes. No prose, no code fences.
+        Return ONLY valid JSON with keys: meta, chords, notes. No prose, no code fences.
         meta must include: title, composer (or "Unknown/Original"), style, key, tempo, time_signature, form.
         chords: dict mapping sections (A1, B, A2, etc.) -> list of bar strings.
-        transposition: dict with instrument keys (Concert, Bb, Eb), each has {"bars":[...]} for first 8 bars.
         notes: short bullet points with performance/arranging advice.
         If the title is likely copyrighted, output an original progression in the style without quoting the original.
         """
@@ -1002,11 +3901,12 @@ def generate_chord_table_with_openai(song_title):
             bpm=120
         )
         
-        client = openai.OpenAI()
+        client = get_async_openai()
         
         # Create the response using the structured JSON format
-        response = client.responses.create(
-            model="gpt-5-mini",
+        response = await client.responses.create(
+            model=SHEET_MODEL,
+            timeout=SHEET_TIMEOUT,
             input=[
                 {"role": "system", "content": SYSTEM_INSTRUCTIONS},
                 {"role": "user", "content": user_prompt},
@@ -1025,6 +3925,10 @@ def generate_chord_table_with_openai(song_title):
         try:
             chord_sheet = ChordSheet.model_validate_json(candidate)
             print(f"Raw GPT-5 response for '{song_title}': {chord_sheet}")
+            # Transposed parts are computed here rather than spending output tokens on them
+            transposed = transpose_chord_sheet(chord_sheet.chords, chord_sheet.meta.get("key", "C major"),
+                                               SHEET_TRANSPOSITIONS)
+            chord_sheet.transposition = {target: {"bars": part["bars"]} for target, part in transposed.items()}
             # Convert Pydantic object to dictionary for JSON serialization
             chord_sheet_dict = chord_sheet.model_dump()
             return {"success": True, "data": {"chord_sheet": chord_sheet_dict}}
@@ -1037,6 +3941,205 @@ def generate_chord_table_with_openai(song_title):
         print(f"OpenAI API error: {e}")
         return {"success": False, "error": str(e)}
         
+@app.cli.command("build-note-bank")
+@click.option("--soundfont", default=SOUNDFONT_PATH, show_default=True, help="SoundFont to render")
+@click.option("--output", default=NOTE_BANK_PATH, show_default=True, help="Bank file to write")
+@click.option("--velocities", default=",".join(map(str, NOTE_BANK_VELOCITIES)), show_default=True,
+              help="Comma-separated velocity layers")
+@click.option("--seconds", default=NOTE_BANK_SECONDS, show_default=True, help="Length of each note")
+def build_note_bank_command(soundfont, output, velocities, seconds):
+    """Pre-render every note of a SoundFont into a memory-mappable bank file"""
+    start = time.perf_counter()
+    index = NoteBank.build(soundfont, output, [int(v) for v in velocities.split(",")], seconds)
+    size_mb = os.path.getsize(output) / (1024 * 1024)
+    click.echo(f"✅ Wrote {output} ({size_mb:.1f} MB, {index['shape'][0]} layers) "
+               f"in {time.perf_counter() - start:.1f}s")
+
+@app.cli.command("check-note-bank")
+@click.option("--soundfont", default=SOUNDFONT_PATH, show_default=True, help="SoundFont the bank should match")
+@click.option("--bank", default=NOTE_BANK_PATH, show_default=True, help="Bank file to check")
+def check_note_bank_command(soundfont, bank):
+    """Verify that a bank file was built from the given SoundFont"""
+    try:
+        NoteBank.load(bank, soundfont)
+    except Exception as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✅ {bank} matches {soundfont}")
+
+@app.cli.command("render-batch")
+@click.argument("songs_file", type=click.File("r"))
+@click.argument("output_dir", type=click.Path(file_okay=False))
+@click.option("--processes", default=os.cpu_count() or 1, show_default=True, help="Render farm worker processes")
+def render_batch_command(songs_file, output_dir, processes):
+    """Render a JSON list of progressions to WAV files across the render farm
+
+    Each entry looks like {"name": "turnaround", "chords": ["C", "Am7", "Dm7", "G7"],
+    "beats": 4, "bpm": 120, "velocity": 96}.
+    """
+    songs = json.load(songs_file)
+    progressions = [(build_symbol_progression(song["chords"], song.get("beats", 4)),
+                     float(song.get("bpm", 120)), int(song.get("velocity", 96))) for song in songs]
+    os.makedirs(output_dir, exist_ok=True)
+    get_render_farm(processes)
+    start = time.perf_counter()
+    names = set()
+    for index, (song, pcm) in enumerate(zip(songs, render_progressions_parallel(progressions)), 1):
+        name = unique_file_name(song.get("name") or f"progression_{index}", names)
+        with open(os.path.join(output_dir, f"{name}.wav"), "wb") as f:
+            f.write(encode_audio(pcm, "wav"))
+    click.echo(f"✅ Rendered {len(songs)} progression(s) with {processes} process(es) "
+               f"in {time.perf_counter() - start:.1f}s")
+
+@app.cli.command("bench-midi")
+@click.option("--count", default=10000, show_default=True, help="Number of progressions to encode")
+@click.option("--seed", default=0, show_default=True, help="Random seed for the generated progressions")
+def bench_midi_command(count, seed):
+    """Compare the mido and bytearray MIDI encoders on random progressions"""
+    import random
+    
+    rng = random.Random(seed)
+    roots = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    chord_types = ['major', 'minor', 'dominant7', 'major7', 'minor7']
+    workload = []
+    for _ in range(count):
+        steps = [{"notes": get_chord_notes(rng.choice(chord_types), rng.choice(roots)),
+                  "beats": rng.choice([1, 2, 4])} for _ in range(rng.randint(4, 32))]
+        workload.append((steps, rng.choice([60, 90, 120, 160])))
+    
+    timings = {}
+    outputs = {}
+    for name, encode in (("mido", write_progression_midi), ("bytearray", encode_progression_midi)):
+        start = time.perf_counter()
+        outputs[name] = [encode(steps, bpm) for steps, bpm in workload]
+        timings[name] = time.perf_counter() - start
+        click.echo(f"{name:>9}: {timings[name]:.2f}s ({count / timings[name]:,.0f} files/s)")
+    
+    mismatches = sum(a != b for a, b in zip(outputs["mido"], outputs["bytearray"]))
+    if mismatches:
+        raise click.ClickException(f"{mismatches} of {count} files differ between encoders")
+    click.echo(f"✅ Byte-identical output, {timings['mido'] / timings['bytearray']:.1f}x faster")
+
+@app.cli.command("check-chords")
+def check_chords_command():
+    """Check the chord-symbol parser against its conformance corpus"""
+    failures = check_chord_conformance()
+    for failure in failures:
+        click.echo(f"❌ {failure}")
+    if failures:
+        raise click.ClickException(f"{len(failures)} of {len(CHORD_CONFORMANCE)} symbols failed")
+    click.echo(f"✅ All {len(CHORD_CONFORMANCE)} symbols parsed as expected")
+
+@app.cli.command("check-titles")
+def check_titles_command():
+    """Check the song title normalizer against its conformance corpus"""
+    failures = check_title_conformance()
+    for failure in failures:
+        click.echo(f"❌ {failure}")
+    if failures:
+        raise click.ClickException(f"{len(failures)} title checks failed")
+    click.echo(f"✅ All {len(TITLE_CONFORMANCE)} titles normalized and "
+               f"{len(TITLE_TYPO_CONFORMANCE)} typo pairs matched as expected")
+
+@app.cli.command("bench-chords")
+@click.option("--count", default=1000000, show_default=True, help="Number of chord symbols to parse")
+@click.option("--seed", default=0, show_default=True, help="Random seed for the generated symbols")
+def bench_chords_command(count, seed):
+    """Time the chord-symbol parser on a realistic mix of symbols, cold and memoized"""
+    import random
+    
+    rng = random.Random(seed)
+    roots = ["C", "C#", "Db", "D", "Eb", "E", "F", "F#", "Gb", "G", "Ab", "A", "Bb", "B"]
+    suffixes = ["", "m", "7", "m7", "maj7", "dim", "dim7", "m7b5", "aug", "sus4", "7sus4", "6", "m6", "9",
+                "13", "7b9", "7#9", "add9", "5", " major", " minor", "/E", "m7/G"]
+    symbols = [rng.choice(roots) + rng.choice(suffixes) for _ in range(count)]
+    distinct = sorted(set(symbols))
+    
+    parse_chord_symbol.cache_clear()
+    start = time.perf_counter()
+    for symbol in distinct:
+        parse_chord_symbol(symbol)
+    cold = time.perf_counter() - start
+    click.echo(f"     cold: {len(distinct)} distinct symbols, {len(distinct) / cold:,.0f} symbols/s")
+    
+    start = time.perf_counter()
+    for symbol in symbols:
+        parse_chord_symbol(symbol)
+    warm = time.perf_counter() - start
+    click.echo(f"memoized: {count:,} symbols, {count / warm:,.0f} symbols/s")
+
+@app.cli.command("bench-voicing")
+@click.option("--bars", default=500, show_default=True, help="Length of the random progression")
+@click.option("--seed", default=0, show_default=True, help="Random seed for the progression")
+def bench_voicing_command(bars, seed):
+    """Time the voice-leading optimizer on a random progression"""
+    import random
+    
+    rng = random.Random(seed)
+    chords = [get_chord_notes(rng.choice(list(CHORD_PATTERNS)), rng.choice(EXPORT_KEYS)) for _ in range(bars)]
+    start = time.perf_counter()
+    voiced = voice_lead(chords)
+    elapsed = time.perf_counter() - start
+    
+    def movement(progression):
+        return sum(sum(min(abs(x - y) for y in b) for x in a) / 2 + sum(min(abs(x - y) for x in a) for y in b) / 2
+                   for a, b in zip(progression, progression[1:]))
+    
+    click.echo(f"✅ Voiced {bars} bars in {elapsed * 1000:.1f} ms; total movement "
+               f"{movement(chords):.0f} → {movement(voiced):.0f} semitones")
+
+@app.cli.command("bench-keys")
+@click.option("--count", default=10000, show_default=True, help="Number of progressions to analyze")
+@click.option("--seed", default=0, show_default=True, help="Random seed for the progressions")
+def bench_keys_command(count, seed):
+    """Time batch key detection on random diatonic progressions with known keys"""
+    import random
+    
+    rng = random.Random(seed)
+    degrees = [(0, "major"), (2, "minor"), (4, "minor"), (5, "major"), (7, "dominant7"), (9, "minor")]
+    progressions, expected = [], []
+    for _ in range(count):
+        tonic = rng.randrange(12)
+        chords = [(0, "major")] + [rng.choice(degrees) for _ in range(14)] + [(7, "dominant7"), (0, "major")]
+        progressions.append([{"notes": get_chord_notes(chord_type, NOTE_NAMES[(tonic + degree) % 12]), "beats": 4}
+                             for degree, chord_type in chords])
+        expected.append(f"{MAJOR_KEY_NAMES[tonic]} major")
+    
+    start = time.perf_counter()
+    results = detect_keys(progressions, top=1)
+    elapsed = time.perf_counter() - start
+    correct = sum(result[0]["key"] == key for result, key in zip(results, expected))
+    click.echo(f"✅ Detected keys of {count:,} progressions in {elapsed * 1000:.1f} ms, "
+               f"{correct / count:.1%} matched the generating key")
+
+@app.cli.command("warm-scale-cache")
+@click.option("--concurrency", default=16, show_default=True, help="Model calls in flight at once")
+@click.option("--force", is_flag=True, help="Ask again even for chords with a fresh answer")
+def warm_scale_cache_command(concurrency, force):
+    """Ask OpenAI for the scales of every root and chord type and store the answers in the LLM cache"""
+    fresh = set() if force else llm_cache.fresh_keys("scales", SCALE_PROMPT_VERSION, SCALE_MODEL, SCALE_CACHE_TTL)
+    chords = [(root, chord_type) for root in NOTE_NAMES.values() for chord_type in CHORD_PATTERNS
+              if _scale_cache_key(root, chord_type) not in fresh]
+    click.echo(f"🎼 {len(fresh)} chord(s) already cached, asking {SCALE_MODEL} about {len(chords)}")
+    
+    async def warm_all():
+        limit = asyncio.Semaphore(concurrency)
+        
+        async def warm(root_note, chord_type):
+            async with limit:
+                result = await analyze_scales_for_chord_async(root_note, chord_type)
+            if result.get("source") != "openai":
+                return False
+            # SQLite writes block, so they run off the LLM loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, llm_cache.put, "scales", _scale_cache_key(root_note, chord_type), SCALE_PROMPT_VERSION,
+                SCALE_MODEL, result["data"])
+            return True
+        
+        return await asyncio.gather(*(warm(*chord) for chord in chords))
+    
+    stored = sum(call_llm(warm_all()))
+    click.echo(f"✅ Cached {stored} answer(s), {len(chords) - stored} failed")
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
 